@@ -1,17 +1,20 @@
 import os
 import argparse
+import time
 from pathlib import Path
 
-from blender_autorender.anim_scn import AnimSceneProcessor
-from blender_autorender.config import (
-    TopLevelConfig,
-    AssetConfig,
-    MaterialConfig,
-    AnimSpriteConfig,
-    AnimSceneConfig,
+from pydantic import ValidationError
+
+from blender_autorender.plan import (
+    load_jobs,
+    load_toplevel_config,
+    print_plan,
+    resolve_path,
 )
-from blender_autorender.anim_sprite import entrypoint
-from blender_autorender.material import entrypoint_material
+from blender_autorender.preflight import preflight
+from blender_autorender.runner import run_jobs
+from blender_autorender.watch import watch
+from blender_autorender import trace
 
 
 def file_path(path: str) -> Path:
@@ -40,75 +43,91 @@ def parse_args():
         required=False,
         default=None,
     )
+    parser.add_argument(
+        "--plan",
+        help="Parse all configs and print the jobs that would run, without rendering",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--validate",
+        help="Parse all configs and check referenced files and names exist, without rendering",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--trace",
+        help="Record per-stage timings and write them as a Chrome trace to this path",
+        type=Path,
+        required=False,
+        default=None,
+    )
+    parser.add_argument(
+        "--progress-json",
+        help="Append machine-readable progress events (JSON lines) to this path",
+        type=Path,
+        required=False,
+        default=None,
+    )
+    parser.add_argument(
+        "--watch",
+        help="Keep running and re-render assets whenever their configs or blend files change",
+        action="store_true",
+    )
 
     return parser.parse_args()
 
 
 def main():
     args = parse_args()
-    print("👋 Hello, world! Let's get started!")
-    with open(args.config, "r") as f:
-        config_json = f.read()
-    config: TopLevelConfig = TopLevelConfig.model_validate_json(config_json)
-    output_dir = resolve_path(args.config, config.output_dir)
-    log_path = resolve_path(args.config, Path("autorender.log"))
-    for collection in config.collections:
-        if args.asset_collection is not None and args.asset_collection != collection.id:
-            continue
-
-        collection_output_dir = output_dir.joinpath(collection.id)
-
-        print(
-            f"Processing collection {collection.id}, results will be saved in {collection_output_dir}"
+    start = time.perf_counter()
+    try:
+        config = load_toplevel_config(args.config)
+    except (OSError, ValidationError) as e:
+        # Nothing else can be checked without the top-level config
+        print(f"❌ {args.config}: {e}")
+        exit(1)
+    jobs, errors = load_jobs(args.config, config, args.asset_collection)
+    if not args.plan:
+        # Catch typos in object, action and material names before any render
+        preflight_cache_dir = resolve_path(args.config, config.output_dir).joinpath(
+            ".cache", "preflight"
         )
+        errors.extend(preflight(jobs, preflight_cache_dir))
+
+    if args.plan or args.validate:
+        if args.plan:
+            print_plan(jobs)
+        for error in errors:
+            print(f"❌ {error}")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"Checked {len(jobs)} asset configs in {elapsed_ms:.1f} ms")
+        exit(1 if errors else 0)
+
+    # Watch mode reports problems and keeps going, so they can be fixed live
+    if errors and not args.watch:
+        for error in errors:
+            print(f"❌ {error}")
+        exit(1)
 
-        for asset_config_path in collection.asset_configs:
-            asset_config_path = resolve_path(args.config, asset_config_path)
-            with open(asset_config_path, "r") as f:
-                asset_config_json = f.read()
-            asset_config: AssetConfig = AssetConfig.model_validate_json(
-                asset_config_json
-            )
-            print(f" - Rendering {asset_config.root.variant} from {asset_config_path}")
-            if isinstance(asset_config.root, MaterialConfig):
-                asset_config.root.blend_file_path = resolve_path(
-                    asset_config_path, asset_config.root.blend_file_path
-                )
-                entrypoint_material(
-                    config=asset_config.root,
-                    toplevel_output_dir=collection_output_dir,
-                    log_path=log_path,
-                )
-            elif isinstance(asset_config.root, AnimSpriteConfig):
-                asset_config.root.blend_file_path = resolve_path(
-                    asset_config_path, asset_config.root.blend_file_path
-                )
-                entrypoint(
-                    config=asset_config.root,
-                    toplevel_output_dir=collection_output_dir,
-                    log_path=log_path,
-                )
-            elif isinstance(asset_config.root, AnimSceneConfig):
-                asset_config.root.blend_file_path = resolve_path(
-                    asset_config_path, asset_config.root.blend_file_path
-                )
-                processor = AnimSceneProcessor(
-                    config=asset_config.root,
-                    toplevel_output_dir=collection_output_dir,
-                    log_path=log_path,
-                )
-                processor.process()
-            else:
-                print(f"Unrecognized asset config variant: {type(asset_config.root)}")
-                exit(1)
-
-        print(f"Finished collection {collection.id}!")
-
-
-def resolve_path(config_path: Path, potentially_relative_path: Path) -> Path:
-    root = config_path.parent
-    return (
-        potentially_relative_path
-        if Path(potentially_relative_path).is_absolute()
-        else root.joinpath(potentially_relative_path)
+    if args.trace is not None:
+        trace.enable()
+
+    print("👋 Hello, world! Let's get started!")
+    if args.watch:
+        # Configs are reloaded and checked again on every change
+        watch(args.config, args.asset_collection, args.progress_json, args.trace)
+        return
+
+    run_jobs(
+        jobs,
+        memory_budget_mb=config.memory_budget_mb,
+        events_path=args.progress_json,
     )
+
+    if args.trace is not None:
+        trace.write_chrome_trace(args.trace)
+        print(trace.summary())
+        print(f"Trace written to {args.trace}")
+
+
+if __name__ == "__main__":
+    main()
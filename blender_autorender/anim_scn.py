@@ -6,6 +6,10 @@ from pathlib import Path
 import tempfile
 from typing import Any
 from blender_autorender.config import ActionConfig, AnimSceneConfig
+from blender_autorender.gltf_split import split_glb
+from blender_autorender.textures import downscale_image
+from blender_autorender.keyframes import simplify_action
+from blender_autorender import trace
 import bpy
 
 bpy: Any
@@ -20,12 +24,14 @@ class AnimSceneProcessor:
             config.id
         )
         self.log_path = log_path
+        self.texture_cache_dir = toplevel_output_dir.joinpath(".cache", "textures")
 
     def process(self):
         run_with_redirected_logs(self.log_path, lambda: self._process())
 
     def _process(self):
-        bpy.ops.wm.open_mainfile(filepath=str(self.config.blend_file_path))
+        with trace.span("open_file", asset=self.config.id):
+            bpy.ops.wm.open_mainfile(filepath=str(self.config.blend_file_path))
 
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
@@ -37,16 +43,26 @@ class AnimSceneProcessor:
         self._delete_unwanted_anims()
         self._setup()
 
-        # Not needed in our workflow, we can just set settings in export
-        # for action_config in self.config.action_configs:
-        #     self._bake_action(action_config)
+        # By default the exporter samples every frame itself. We only bake
+        # ourselves when the keys need thinning out before export.
+        if self._needs_bake():
+            for action_config in self.config.action_configs:
+                self._bake_action(action_config)
+            self._clear_constraints()
+            for action_config in self.config.action_configs:
+                self._simplify_action(action_config)
 
         # This seems to not be needed (?)
         # for action_config in self.config.action_configs:
         #     self._move_action_to_nla(action_config)
 
         self._clear_active_animation()
-        self._export_gltf()
+        if self.config.texture.max_size is not None:
+            self._downscale_textures(self.config.texture.max_size)
+        if self.config.split_actions:
+            self._export_split_gltf()
+        else:
+            self._export_gltf(self.output_dir.joinpath("model.glb"))
 
     def _clear_all_object_animations(self):
         for obj in bpy.data.objects:
@@ -60,6 +76,12 @@ class AnimSceneProcessor:
             if action.name not in animset:
                 bpy.data.actions.remove(action)
 
+    def _needs_bake(self) -> bool:
+        return any(
+            a.bake_config.step != 1 or a.bake_config.simplify is not None
+            for a in self.config.action_configs
+        )
+
     def _bake_action(self, config: ActionConfig):
         obj = bpy.data.objects[self.config.object_name]
         action = bpy.data.actions[config.action_name]
@@ -77,17 +99,43 @@ class AnimSceneProcessor:
         if obj.type == "ARMATURE":
             bpy.ops.object.mode_set(mode="POSE")
             bpy.ops.pose.select_all(action="SELECT")
+            bake_types = {"POSE", "OBJECT"}
+        else:
+            bake_types = {"OBJECT"}
+
+        # Constraints are cleared once every action has been baked, otherwise
+        # the actions baked later would lose their effect
+        with trace.span("action_bake", asset=self.config.id, action=config.action_name):
+            bpy.ops.nla.bake(
+                frame_start=int(action.frame_range[0]),
+                frame_end=int(action.frame_range[1]),
+                step=config.bake_config.step,
+                only_selected=False,
+                visual_keying=True,
+                clear_constraints=False,
+                clear_parents=False,
+                use_current_action=True,
+                bake_types=bake_types,
+            )
 
-        bpy.ops.nla.bake(
-            frame_start=int(action.frame_range[0]),
-            frame_end=int(action.frame_range[1]),
-            step=config.bake_config.step,
-            only_selected=False,
-            visual_keying=True,
-            clear_constraints=True,
-            clear_parents=False,
-            use_current_action=True,
-        )
+        bpy.ops.object.mode_set(mode="OBJECT")
+
+    def _clear_constraints(self):
+        obj = bpy.data.objects[self.config.object_name]
+        for constraint in list(obj.constraints):
+            obj.constraints.remove(constraint)
+        if obj.pose is not None:
+            for bone in obj.pose.bones:
+                for constraint in list(bone.constraints):
+                    bone.constraints.remove(constraint)
+
+    def _simplify_action(self, config: ActionConfig):
+        if config.bake_config.simplify is None:
+            return
+        action = bpy.data.actions[config.action_name]
+        with trace.span("simplify", asset=self.config.id, action=config.action_name):
+            before, after = simplify_action(action, config.bake_config.simplify)
+        print(f"Action {config.action_name}: reduced {before} keys to {after}")
 
     def _setup(self):
         obj = bpy.data.objects[self.config.object_name]
@@ -106,17 +154,47 @@ class AnimSceneProcessor:
         obj = bpy.data.objects[self.config.object_name]
         obj.animation_data.action = None
 
-    def _export_gltf(self):
-        bpy.ops.export_scene.gltf(
-            filepath=str(self.output_dir.joinpath("model.glb")),
-            export_format="GLB",
-            export_animations=True,
-            export_animation_mode="ACTIONS",
-            export_force_sampling=True,
-            export_bake_animation=True,
-            export_apply=True,
-            export_def_bones=True,
-        )
+    def _downscale_textures(self, max_size: int):
+        for image in bpy.data.images:
+            if image.type != "IMAGE" or image.users == 0:
+                continue
+            with trace.span(
+                "texture_downscale", asset=self.config.id, image=image.name
+            ):
+                downscale_image(
+                    image,
+                    abspath=bpy.path.abspath(image.filepath),
+                    max_size=max_size,
+                    cache_dir=self.texture_cache_dir,
+                )
+
+    def _export_gltf(self, path: Path):
+        with trace.span("gltf_export", asset=self.config.id):
+            bpy.ops.export_scene.gltf(
+                filepath=str(path),
+                export_format="GLB",
+                export_animations=True,
+                export_animation_mode="ACTIONS",
+                # Baked actions already hold exactly the keys we want to ship
+                export_force_sampling=not self._needs_bake(),
+                export_bake_animation=True,
+                export_apply=True,
+                export_def_bones=True,
+                export_image_format=self.config.texture.image_format,
+                export_image_quality=self.config.texture.quality,
+            )
+
+    def _export_split_gltf(self):
+        # Export everything once, then split the file. This keeps node indices
+        # identical between the skeleton and the animation files.
+        with tempfile.TemporaryDirectory() as temp_dir:
+            combined_path = Path(temp_dir).joinpath("model.glb")
+            self._export_gltf(combined_path)
+            with trace.span("gltf_split", asset=self.config.id):
+                index_path = split_glb(
+                    combined_path, self.output_dir, workers=self.config.workers
+                )
+        print(f"Split animations written, index at {index_path}")
 
     def _save_temp_for_debug(self, name: str = "debug_scene"):
         temp_dir = tempfile.mkdtemp()
@@ -1,15 +1,46 @@
 from pathlib import Path
 from typing import Any
 from blender_autorender.utils import (
-    pack_channels,
     reconnect_bsdf_input,
     run_with_redirected_logs,
 )
 import bpy
+import json
+import math
+import multiprocessing
 import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+import numpy as np
 from PIL import Image
 
-from blender_autorender.config import CameraConfig, AnimSpriteConfig, ObjConfig
+from blender_autorender.config import (
+    CameraConfig,
+    AnimSpriteConfig,
+    ObjConfig,
+    PngConfig,
+)
+from blender_autorender import progress, trace
+from blender_autorender.datablocks import TempDataBlocks
+from blender_autorender.geometry_cache import GeometryCache, bake_geometry_cache
+from blender_autorender.palette import (
+    TRANSPARENT_INDEX,
+    quantize_sheets,
+    write_palette_file,
+)
+from blender_autorender.normals import encode_depth, encode_normals
+from blender_autorender.passes import PASSES, render_groups, resolve_passes
+from blender_autorender.sheets import (
+    build_spritesheet,
+    sized_spritesheets,
+    traced_pack_channels,
+)
+from blender_autorender.textures import read_pixels
+from blender_autorender.writer import (
+    ImageWriter,
+    blender_compression,
+    png_save_options,
+)
 
 bpy: Any
 
@@ -35,8 +66,11 @@ def set_actions_for_objects(objects: list[ObjConfig]):
             set_action_for_object(obj_config.object_name, obj_config.action_name)
 
 
-def apply_camera_config(cam_config: CameraConfig):
-    """Set the camera to orthographic and orient it to the given view."""
+def apply_camera_config(cam_config: CameraConfig, yaw: float = 0.0):
+    """Set the camera to orthographic and orient it to the given view.
+
+    The camera is then turned `yaw` degrees around the pivot's Z axis.
+    """
     cam: Any = bpy.data.objects.get("Camera")
     if not cam:
         raise ValueError("No camera object found.")
@@ -46,19 +80,45 @@ def apply_camera_config(cam_config: CameraConfig):
 
     cam.data.ortho_scale = cam_config.ortho_scale
 
-    # Position the camera based on the view
+    # Position the camera based on the view, relative to the pivot
     if cam_config.view == "FRONT":
-        cam.location = (0, -10, 0)
-        cam.rotation_euler = (0, 0, 0)
+        offset = (0, -10, 0)
+        rotation = (0, 0, 0)
     elif cam_config.view == "SIDE":
-        cam.location = (-10, 0, 0)
-        cam.rotation_euler = (0, 1.5708, 0)  # 90 degrees rotation
+        offset = (-10, 0, 0)
+        rotation = (0, 1.5708, 0)  # 90 degrees rotation
     elif cam_config.view == "TOP":
-        cam.location = (0, 0, 10)
-        cam.rotation_euler = (0, 0, 0)  # 90 degrees rotation in X
+        offset = (0, 0, 10)
+        rotation = (0, 0, 0)  # 90 degrees rotation in X
     else:
         raise ValueError(f"Unknown camera view: {cam_config.view}")
 
+    # XYZ euler angles apply Z last, so adding the yaw to it turns the camera
+    # around the world Z axis
+    angle = math.radians(yaw)
+    x, y, z = offset
+    px, py, pz = cam_config.pivot
+    cam.location = (
+        px + x * math.cos(angle) - y * math.sin(angle),
+        py + x * math.sin(angle) + y * math.cos(angle),
+        pz + z,
+    )
+    cam.rotation_euler = (rotation[0], rotation[1], rotation[2] + angle)
+
+
+def direction_output_dirs(
+    config: AnimSpriteConfig, output_dir: Path
+) -> list[tuple[float, Path]]:
+    """Yaw and output directory of each direction to render.
+
+    A single direction writes straight to `output_dir`, as before directions
+    existed.
+    """
+    yaws = config.camera.yaws()
+    if len(yaws) == 1:
+        return [(yaws[0], output_dir)]
+    return [(yaw, output_dir.joinpath(f"direction_{i}")) for i, yaw in enumerate(yaws)]
+
 
 def configure_transparent_background():
     """Configure Blender render settings for transparent background."""
@@ -86,37 +146,52 @@ def cleanup_nodes():
 def render_bsdf_input(
     config: AnimSpriteConfig,
     frame: int,
-    output_dir: Path,
+    directions: list[tuple[float, Path]],
     bsdf_input_name: str,
     saved_prefix: str,
-) -> Path:
+    png: PngConfig,
+    data_passes: tuple[str, ...] = (),
+) -> dict[str, list[Path]]:
     """Render out the a particular BSDF input from a scene as emissive color layer.
 
+    The scene, posed at `frame` by `pose`, is rendered from each direction in
+    turn. The same renders also produce the `data_passes` ("normal", "depth")
+    from Cycles' data passes. Returns the rendered files of each pass, one
+    per direction.
+
+    Materials are restored afterwards and every other setting is set again by
+    the next call, so the file needn't be reverted between renders.
+
     Only works if the final output of each material used is a BSDF node.
     """
-    setup(config, frame)
-
     original_materials = dict()
+    temp = TempDataBlocks()
 
     for i, obj_config in enumerate(config.object_configs):
         obj = bpy.data.objects.get(obj_config.object_name)
         if not obj.material_slots:
-            mat = bpy.data.materials.new(name=f"{obj.name}_Material")
+            mat = temp.track(
+                "materials", bpy.data.materials.new(name=f"{obj.name}_Material")
+            )
             mat.use_nodes = True
             obj.data.materials.append(mat)
         for j, slot in enumerate(obj.material_slots):
             if not slot.material:
-                mat = bpy.data.materials.new(name=f"{obj.name}_{j}_Material")
+                mat = temp.track(
+                    "materials",
+                    bpy.data.materials.new(name=f"{obj.name}_{j}_Material"),
+                )
                 mat.use_nodes = True
                 slot.material = mat
 
             print(f"Obj {obj_config.object_name} slot {j}: Replacing material")
             original_materials[(i, j)] = slot.material
 
+            # reconnect_bsdf_input works on its own copy of the material
             new_mat = reconnect_bsdf_input(
-                slot.material.copy(), bsdf_input_name=bsdf_input_name
+                slot.material, bsdf_input_name=bsdf_input_name
             )
-            slot.material = new_mat
+            slot.material = temp.track("materials", new_mat)
 
     scene = bpy.context.scene
     scene.render.engine = "CYCLES"
@@ -147,8 +222,8 @@ def render_bsdf_input(
     # Create a node for outputting the rendered image
     image_output_node = tree.nodes.new(type="CompositorNodeOutputFile")
     image_output_node.label = "Image_Output"
-    image_output_node.base_path = str(output_dir.joinpath(saved_prefix))
     image_output_node.file_slots[0].path = f"{saved_prefix}_####"
+    image_output_node.format.compression = blender_compression(png)
     image_output_node.location = 400, 0
 
     # Create a node for the output from the renderer
@@ -158,72 +233,122 @@ def render_bsdf_input(
     # Link to compositor output
     links.new(render_layers_node.outputs["Image"], image_output_node.inputs["Image"])
 
-    scene.frame_set(frame)
-    bpy.ops.render.render(write_still=True)
-
-    pathmaker = lambda t: output_dir.joinpath(f"{t}/{t}_{frame:04d}.png")
-
-    return pathmaker(saved_prefix)
-
-
-def render_diffuse_extract(
-    config: AnimSpriteConfig, frame: int, output_dir: Path
-) -> Path:
-    """Render out the raw albedo by directing the material base color to an emissive material node, and using that as the output.
-
-    Only works if the final output of each material used is a BSDF node.
-    """
-
-    return render_bsdf_input(config, frame, output_dir, "Base Color", "diffuse")
-
-
-def render_metallic_extract(
-    config: AnimSpriteConfig, frame: int, output_dir: Path
-) -> Path:
-    return render_bsdf_input(config, frame, output_dir, "Metallic", "metallic")
-
-
-def render_roughness_extract(
-    config: AnimSpriteConfig, frame: int, output_dir: Path
-) -> Path:
-    return render_bsdf_input(config, frame, output_dir, "Roughness", "roughness")
-
-
-def render_normal(config: AnimSpriteConfig, frame: int, output_dir: Path) -> Path:
-    """Configure Blender to output specific render passes (Diffuse and Normal)."""
-
-    setup(config, frame)
-
-    output_path = output_dir.joinpath(f"normal/normal_{frame:04d}.png")
+    view_layer = scene.view_layers[0]
+    view_layer.use_pass_normal = "normal" in data_passes
+    view_layer.use_pass_z = "depth" in data_passes
+
+    geometry_output_node = None
+    if data_passes:
+        # Written as float EXRs, then read back and encoded by
+        # write_geometry_passes
+        geometry_output_node = tree.nodes.new(type="CompositorNodeOutputFile")
+        geometry_output_node.label = "Geometry_Output"
+        geometry_output_node.format.file_format = "OPEN_EXR"
+        geometry_output_node.format.color_depth = "32"
+        geometry_output_node.location = 400, -200
+        render_outputs = {"normal": "Normal", "depth": "Depth"}
+        for i, name in enumerate(data_passes):
+            if i == 0:
+                geometry_output_node.file_slots[0].path = f"{name}_####"
+            else:
+                geometry_output_node.file_slots.new(f"{name}_####")
+            links.new(
+                render_layers_node.outputs[render_outputs[name]],
+                geometry_output_node.inputs[i],
+            )
 
-    # Clear existing materials
-    for mat in bpy.data.materials:
-        bpy.data.materials.remove(mat)
+    paths: dict[str, list[Path]] = {saved_prefix: []}
+    for yaw, direction_dir in directions:
+        apply_camera_config(config.camera, yaw)
+        # Renders evaluate their own depsgraph, so the camera's matrix_world,
+        # read by write_geometry_passes, only follows the new transform once
+        # the view layer is updated
+        bpy.context.view_layer.update()
+        image_output_node.base_path = str(direction_dir.joinpath(saved_prefix))
+        if geometry_output_node is not None:
+            geometry_output_node.base_path = str(direction_dir.joinpath("geometry"))
+        with trace.span(
+            "render",
+            asset=config.id,
+            render_pass=saved_prefix,
+            frame=frame,
+            direction=yaw,
+        ):
+            bpy.ops.render.render(write_still=True)
+        progress.render_done()
+        image_path = direction_dir.joinpath(
+            f"{saved_prefix}/{saved_prefix}_{frame:04d}.png"
+        )
+        paths[saved_prefix].append(image_path)
+        if geometry_output_node is not None:
+            geometry_paths = write_geometry_passes(
+                config, frame, direction_dir, image_path, data_passes, png
+            )
+            for name, path in geometry_paths.items():
+                paths.setdefault(name, []).append(path)
 
-    scene = bpy.context.scene
-    scene.use_nodes = True
-    cleanup_nodes()
-    scene.use_nodes = False
+    for (i, j), material in original_materials.items():
+        obj = bpy.data.objects.get(config.object_configs[i].object_name)
+        obj.material_slots[j].material = material
+    temp.cleanup()
 
-    scene.render.image_settings.file_format = "PNG"
-    scene.render.engine = "BLENDER_WORKBENCH"
-    scene.render.filepath = str(output_path)
+    return paths
 
-    scene.render.film_transparent = True
-    scene.view_settings.view_transform = "Standard"
-    scene.sequencer_colorspace_settings.name = "Non-Color"
 
-    scene.display.shading.type = "SOLID"
-    scene.display.shading.light = "MATCAP"
-    scene.display.shading.studio_light = "check_normal+y.exr"
-    # Adjust the light settings if needed (for studio light)
-    scene.display.shading.use_scene_lights = False  # Disable scene lights
-    scene.display.shading.use_scene_world = False  # Disable scene world
-    scene.display.shading.show_specular_highlight = False  # Disable scene world
+def read_raw_pass(path: Path) -> np.ndarray:
+    """Read a float pass written by the compositor, top row first, and delete
+    the file."""
+    image = bpy.data.images.load(str(path))
+    try:
+        image.colorspace_settings.is_data = True
+        return np.flipud(read_pixels(image))
+    finally:
+        bpy.data.images.remove(image)
+        path.unlink()
 
-    bpy.ops.render.render(write_still=True)
 
-    return output_path
+def write_geometry_passes(
+    config: AnimSpriteConfig,
+    frame: int,
+    direction_dir: Path,
+    image_path: Path,
+    data_passes: tuple[str, ...],
+    png: PngConfig,
+) -> dict[str, Path]:
+    """Encode the raw data passes of the render that produced `image_path`,
+    using its alpha as coverage.
+
+    Normals are rotated into the space of the camera as it was for that
+    render, so this has to run before the camera moves.
+    """
+    camera = bpy.data.objects.get("Camera")
+    rotation = np.array(camera.matrix_world.to_3x3(), dtype=np.float32)
+    raw_dir = direction_dir.joinpath("geometry")
+    save_options = png_save_options(png)
+
+    with trace.span("encode_geometry", asset=config.id, frame=frame):
+        with Image.open(image_path) as image:
+            alpha = np.asarray(image.convert("RGBA").getchannel("A"))
+
+        outputs = {}
+        for name in data_passes:
+            raw = read_raw_pass(raw_dir.joinpath(f"{name}_{frame:04d}.exr"))
+            if name == "normal":
+                encoded = Image.fromarray(
+                    encode_normals(raw[..., :3], rotation, alpha), mode="RGBA"
+                )
+            elif name == "depth":
+                encoded = Image.fromarray(
+                    encode_depth(
+                        raw[..., 0], alpha, camera.data.clip_start, camera.data.clip_end
+                    )
+                )
+            else:
+                raise ValueError(f"Unknown data pass: {name}")
+            outputs[name] = direction_dir.joinpath(f"{name}/{name}_{frame:04d}.png")
+            outputs[name].parent.mkdir(parents=True, exist_ok=True)
+            encoded.save(outputs[name], **save_options)
+    return outputs
 
 
 def render_frame_with_passes(output_dir, frame, obj_name):
@@ -375,108 +500,419 @@ def get_action_frame_range(action_name):
     return int(min_frame), int(max_frame)
 
 
-def setup(config: AnimSpriteConfig, frame: int):
-    bpy.ops.wm.revert_mainfile()
+def setup(config: AnimSpriteConfig, png: PngConfig):
+    """Revert the file and apply the clip's actions and render settings.
 
-    configure_transparent_background()
+    Runs once per clip, so that actions set by a previous clip don't leak
+    into this one.
+    """
+    with trace.span("revert", asset=config.id):
+        bpy.ops.wm.revert_mainfile()
+
+    with trace.span("scene_setup", asset=config.id):
+        configure_transparent_background()
+
+        # Set action and camera view
+        set_actions_for_objects(config.object_configs)
+        apply_camera_config(config.camera)
+        # Prepare for rendering
+        scene = bpy.context.scene
+        scene.render.image_settings.file_format = "PNG"
+        scene.render.image_settings.compression = blender_compression(png)
+        scene.render.resolution_x = config.sprite_size
+        scene.render.resolution_y = config.sprite_size
+
+
+def pose(config: AnimSpriteConfig, frame: int, cache: GeometryCache | None = None):
+    """Evaluate the scene at `frame`, shared by every render of that frame."""
+    with trace.span("pose", asset=config.id, frame=frame):
+        if cache is not None:
+            cache.apply(frame)
+        bpy.context.scene.frame_set(frame)
+
+
+def render_spritesheet(config: AnimSpriteConfig, output_dir: Path, png: PngConfig):
+    """Render an animation as a spritesheet.
+
+    All clips are rendered from one loaded file, or spread over worker
+    processes each loading their own copy. Channel packing and sheet
+    assembly run in background writer processes, so they overlap with the
+    renders of the following frames.
+    """
 
-    # Set action and camera view
-    set_actions_for_objects(config.object_configs)
-    apply_camera_config(config.camera)
-    # Prepare for rendering
-    scene = bpy.context.scene
-    scene.render.image_settings.file_format = "PNG"
-    scene.render.resolution_x = config.sprite_size
-    scene.render.resolution_y = config.sprite_size
-    bpy.context.scene.frame_set(frame)
+    # Ensure output directory exists
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    clips = clip_output_dirs(config, output_dir)
+
+    with ImageWriter(png) as writer:
+        if config.workers > 1 and len(clips) > 1:
+            clip_passes = render_clips_in_workers(config, clips, png)
+        else:
+            with trace.span("open_file", asset=config.id):
+                bpy.ops.wm.open_mainfile(filepath=str(config.blend_file_path))
+            clip_passes = [
+                render_frames(clip_config, clip_dir, png, writer)
+                for clip_config, clip_dir in clips
+            ]
+
+        with trace.span("sheet_assembly", asset=config.id):
+            write_spritesheets(config, clips, clip_passes, output_dir, writer)
+            writer.wait()
+
+
+def clip_output_dirs(
+    config: AnimSpriteConfig, output_dir: Path
+) -> list[tuple[AnimSpriteConfig, Path]]:
+    """Config and output directory of each clip to render.
+
+    An asset without clips writes straight to `output_dir`.
+    """
+    if not config.clips:
+        return [(config, output_dir)]
+    return [
+        (clip_config, output_dir.joinpath(clip.name))
+        for clip, clip_config in zip(config.clips, config.clip_configs())
+    ]
+
+
+def render_frames(
+    config: AnimSpriteConfig, output_dir: Path, png: PngConfig, writer: ImageWriter
+) -> dict[str, list[list[Path]]]:
+    """Render every frame of a clip for each pass and direction.
+
+    The file is set up once for the clip and posed once per frame. Only the
+    renders needed by the configured passes run, each from every direction,
+    so the posed scene is shared by all passes and camera angles. With
+    `geometry_cache`, deformation is evaluated once per frame up front and
+    every render uses the cached meshes instead. Returns the frame files of
+    each configured pass, per direction.
+    """
+    directions = direction_output_dirs(config, output_dir)
+    setup(config, png)
+
+    cache = None
+    if config.geometry_cache:
+        with trace.span("geometry_cache", asset=config.id):
+            cache = bake_geometry_cache(
+                config.frames(), output_dir.joinpath(".cache", "geometry")
+            )
 
+    groups = render_groups(config.passes)
+    packed = [n for n in resolve_passes(config.passes) if PASSES[n].packed_channels]
+
+    # Render each frame as an image for each pass and direction
+    files: dict[str, list[list[Path]]] = {}
+    futures: dict[str, list[list[Future[Path]]]] = {
+        name: [[] for _ in directions] for name in packed
+    }
+    for frame in config.frames():
+        pose(config, frame, cache)
+        frame_paths: dict[str, list[Path]] = {}
+        for group in groups:
+            frame_paths.update(
+                render_bsdf_input(
+                    config,
+                    frame,
+                    directions,
+                    group.bsdf_input,
+                    group.name,
+                    png,
+                    data_passes=group.data_passes,
+                )
+            )
+        for name in packed:
+            channels = PASSES[name].packed_channels or ()
+            for d, (_, direction_dir) in enumerate(directions):
+                futures[name][d].append(
+                    writer.submit(
+                        traced_pack_channels,
+                        config,
+                        frame,
+                        name,
+                        [frame_paths[c][d] if c else None for c in channels],
+                        output_file_name=f"{name}_{frame:04d}.png",
+                        output_dir=direction_dir.joinpath(name),
+                        save_options=writer.save_options,
+                    )
+                )
+        for name, per_direction in frame_paths.items():
+            for d, path in enumerate(per_direction):
+                files.setdefault(name, [[] for _ in directions])[d].append(path)
+
+    if cache is not None:
+        cache.remove()
+
+    for name, per_direction in futures.items():
+        files[name] = [[f.result() for f in frames] for frames in per_direction]
+    # Passes only rendered for others to be assembled from get no sheet
+    return {name: files[name] for name in config.passes}
+
+
+def _render_clip_worker(
+    config: AnimSpriteConfig, output_dir: Path, png: PngConfig, trace_enabled: bool
+) -> tuple[dict[str, list[list[Path]]], list[dict[str, Any]]]:
+    if trace_enabled:
+        trace.enable()
+    with trace.span("open_file", asset=config.id):
+        bpy.ops.wm.open_mainfile(filepath=str(config.blend_file_path))
+    with ImageWriter(png) as writer:
+        passes = render_frames(config, output_dir, png, writer)
+    return passes, trace.drain()
+
+
+def render_clips_in_workers(
+    config: AnimSpriteConfig,
+    clips: list[tuple[AnimSpriteConfig, Path]],
+    png: PngConfig,
+) -> list[dict[str, list[list[Path]]]]:
+    """Render the frames of each clip in a pool of worker processes.
 
-def build_spritesheet(
-    sprite_paths: list[Path],
-    output_file_name: str,
+    Their renders are reported to this process's progress tracker as they
+    finish.
+    """
+    context = multiprocessing.get_context("spawn")
+    progress_events = context.SimpleQueue()
+    relay = threading.Thread(
+        target=progress.relay,
+        args=(progress_events, progress.current()),
+        name="progress-relay",
+        daemon=True,
+    )
+    relay.start()
+    try:
+        with ProcessPoolExecutor(
+            max_workers=min(config.workers, len(clips)),
+            mp_context=context,
+            initializer=progress.forward_to,
+            initargs=(progress_events,),
+        ) as pool:
+            futures = [
+                pool.submit(
+                    _render_clip_worker, clip_config, clip_dir, png, trace.enabled()
+                )
+                for clip_config, clip_dir in clips
+            ]
+            clip_passes = []
+            for future in futures:
+                passes, events = future.result()
+                trace.extend(events)
+                clip_passes.append(passes)
+    finally:
+        progress_events.put(None)
+        relay.join()
+    return clip_passes
+
+
+def write_spritesheets(
     config: AnimSpriteConfig,
+    clips: list[tuple[AnimSpriteConfig, Path]],
+    clip_passes: list[dict[str, list[list[Path]]]],
     output_dir: Path,
+    writer: ImageWriter,
 ):
-    num_sprites = len(sprite_paths)
-    num_rows = num_sprites // config.sheet_width + (
-        1 if num_sprites % config.sheet_width != 0 else 0
-    )
-    spritesheet_width = config.sheet_width * config.sprite_size
-    spritesheet_height = num_rows * config.sprite_size
-    spritesheet = Image.new("RGBA", (spritesheet_width, spritesheet_height))
-    for index, diffuse_file in enumerate(sprite_paths):
-        diffuse_image = Image.open(diffuse_file)
-        x = (index % config.sheet_width) * config.sprite_size
-        y = (index // config.sheet_width) * config.sprite_size
-        spritesheet.paste(diffuse_image, (x, y))
-
-    spritesheet_output_path = output_dir.joinpath(output_file_name)
-    spritesheet.save(spritesheet_output_path)
-    print(f"Spritesheet saved at {spritesheet_output_path}")
+    """Assemble and write the sheets of every clip, per clip or as an atlas.
 
+    Sheets selected for palette quantization share one palette across all
+    clips.
+    """
+    if config.clip_layout == "atlas" and config.clips:
+        # Stack the clips of each direction, each starting on a new row
+        passes = {
+            name: [
+                [
+                    path
+                    for passes in clip_passes
+                    for path in pad_rows(passes[name][d], config.sheet_width)
+                ]
+                for d in range(len(per_direction))
+            ]
+            for name, per_direction in clip_passes[0].items()
+        }
+        targets = [(config, output_dir, passes)]
+    else:
+        targets = [
+            (clip_config, clip_dir, passes)
+            for (clip_config, clip_dir), passes in zip(clips, clip_passes)
+        ]
+
+    indexed_sheets = config.palette.sheets if config.palette else []
+    assembled = []
+    for target_config, target_dir, passes in targets:
+        directions = direction_output_dirs(target_config, target_dir)
+        for name, file_name, sprite_paths in layout_sheets(
+            config, directions, target_dir, passes
+        ):
+            file_name = str(target_dir.relative_to(output_dir).joinpath(file_name))
+            if name in indexed_sheets:
+                assembled.append(
+                    writer.submit(sized_spritesheets, sprite_paths, file_name, config)
+                )
+                continue
+            writer.submit(
+                build_spritesheet,
+                sprite_paths,
+                file_name,
+                config,
+                output_dir=output_dir,
+                save_options=writer.save_options,
+            )
+        if len(directions) > 1:
+            rows = sheet_rows(len(next(iter(passes.values()))[0]), config.sheet_width)
+            write_direction_index(config, directions, target_dir, rows)
+
+    if config.clips:
+        write_clip_index(config, clips, output_dir)
+
+    if config.palette is not None:
+        write_indexed_spritesheets(
+            {name: sheet for f in assembled for name, sheet in f.result().items()},
+            config,
+            output_dir,
+            writer,
+        )
 
-def render_spritesheet(config: AnimSpriteConfig, output_dir: Path):
-    """Render an animation as a spritesheet."""
 
-    bpy.ops.wm.open_mainfile(filepath=str(config.blend_file_path))
+def pad_rows(sprite_paths: list[Path], sheet_width: int) -> list[Path | None]:
+    """Pad with empty cells up to a whole number of sheet rows."""
+    return list(sprite_paths) + [None] * (-len(sprite_paths) % sheet_width)
 
-    # Ensure output directory exists
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
 
-    # Render each frame as an image for each pass (Diffuse and Normal)
-    diffuse_files = []
-    normal_files = []
-    metallic_files = []
-    roughness_files = []
-    orm_files = []
+def sheet_rows(sprite_count: int, sheet_width: int) -> int:
+    return -(-sprite_count // sheet_width)
 
-    frame = config.start_frame
 
-    condition = (
-        (lambda frame: frame <= config.end_frame)
-        if config.include_last_frame
-        else (lambda frame: frame < config.end_frame)
-    )
+def layout_sheets(
+    config: AnimSpriteConfig,
+    directions: list[tuple[float, Path]],
+    output_dir: Path,
+    passes: dict[str, list[list[Path | None]]],
+) -> list[tuple[str, str, list[Path | None]]]:
+    """Sheets to assemble, as (pass name, file name relative to `output_dir`,
+    sprite paths) tuples.
 
-    while condition(frame):
-        diffuse_path = render_diffuse_extract(config, frame, output_dir=output_dir)
-        metallic_path = render_metallic_extract(config, frame, output_dir=output_dir)
-        roughness_path = render_roughness_extract(config, frame, output_dir=output_dir)
-        normal_path = render_normal(config, frame, output_dir=output_dir)
-        orm_path = pack_channels(
-            None,
-            roughness_path,
-            metallic_path,
-            output_file_name=diffuse_path.name.replace("diffuse", "orm"),
-            img_size=config.sprite_size,
-            output_dir=output_dir.joinpath("orm"),
+    `passes` holds the frames of each pass, per direction. In the combined
+    layout every direction starts on a new row of a single sheet.
+    """
+    if config.camera.layout == "combined" and len(directions) > 1:
+        return [
+            (
+                name,
+                f"{name}.png",
+                [
+                    path
+                    for frames in per_direction
+                    for path in pad_rows(frames, config.sheet_width)
+                ],
+            )
+            for name, per_direction in passes.items()
+        ]
+
+    return [
+        (
+            name,
+            str(direction_dir.relative_to(output_dir).joinpath(f"{name}.png")),
+            list(per_direction[d]),
         )
-        diffuse_files.append(diffuse_path)
-        normal_files.append(normal_path)
-        metallic_files.append(metallic_path)
-        roughness_files.append(roughness_path)
-        orm_files.append(orm_path)
+        for d, (_, direction_dir) in enumerate(directions)
+        for name, per_direction in passes.items()
+    ]
 
-        frame += config.frame_step
 
-    build_spritesheet(diffuse_files, "diffuse.png", config, output_dir=output_dir)
-    build_spritesheet(normal_files, "normal.png", config, output_dir=output_dir)
-    build_spritesheet(roughness_files, "roughness.png", config, output_dir=output_dir)
-    build_spritesheet(metallic_files, "metallic.png", config, output_dir=output_dir)
-    build_spritesheet(orm_files, "orm.png", config, output_dir=output_dir)
+def write_direction_index(
+    config: AnimSpriteConfig,
+    directions: list[tuple[float, Path]],
+    output_dir: Path,
+    rows: int,
+):
+    """Write `directions.json`, telling where each direction's sprites are.
 
+    `rows` is the number of sheet rows taken by one direction.
+    """
+    entries: list[dict[str, Any]] = []
+    for d, (yaw, direction_dir) in enumerate(directions):
+        entry: dict[str, Any] = {"index": d, "yaw": yaw}
+        if config.camera.layout == "combined":
+            entry["row"] = d * rows
+            entry["rows"] = rows
+        else:
+            entry["dir"] = str(direction_dir.relative_to(output_dir))
+        entries.append(entry)
 
-def validations(config: AnimSpriteConfig):
-    if (config.end_frame - config.end_frame + 1) % config.frame_step != 0:
-        raise ValueError("Frame step does not divide the total number of frames")
+    index_path = output_dir.joinpath("directions.json")
+    with open(index_path, "w") as f:
+        json.dump({"layout": config.camera.layout, "directions": entries}, f, indent=2)
+    print(f"Direction index saved at {index_path}")
 
 
-def entrypoint(config: AnimSpriteConfig, toplevel_output_dir: Path, log_path: Path):
-    output_dir = toplevel_output_dir.joinpath("spritesheets").joinpath(config.id)
+def write_clip_index(
+    config: AnimSpriteConfig,
+    clips: list[tuple[AnimSpriteConfig, Path]],
+    output_dir: Path,
+):
+    """Write `clips.json`, telling where each clip's sprites are.
 
-    validations(config)
+    In the atlas layout, rows are counted from the top of each direction's
+    block of rows.
+    """
+    entries: list[dict[str, Any]] = []
+    row = 0
+    for clip, (clip_config, clip_dir) in zip(config.clips, clips):
+        frames = clip_config.frames()
+        entry: dict[str, Any] = {
+            "name": clip.name,
+            "frames": len(frames),
+            "start_frame": frames[0] if frames else clip.start_frame,
+            "dir": str(clip_dir.relative_to(output_dir)),
+        }
+        if config.clip_layout == "atlas":
+            rows = sheet_rows(len(frames), config.sheet_width)
+            entry["row"] = row
+            entry["rows"] = rows
+            row += rows
+        entries.append(entry)
+
+    index_path = output_dir.joinpath("clips.json")
+    with open(index_path, "w") as f:
+        json.dump({"layout": config.clip_layout, "clips": entries}, f, indent=2)
+    print(f"Clip index saved at {index_path}")
+
+
+def write_indexed_spritesheets(
+    sheets: dict[str, Image.Image],
+    config: AnimSpriteConfig,
+    output_dir: Path,
+    writer: ImageWriter,
+):
+    """Quantize sheets to their shared palette and write them as indexed PNGs.
+
+    `sheets` is keyed by file name relative to `output_dir`.
+    """
+    assert config.palette is not None
+    with trace.span("palette_quantize", asset=config.id):
+        indexed, colors = quantize_sheets(sheets, config.palette)
+    for file_name, image in indexed.items():
+        path = output_dir.joinpath(file_name)
+        writer.save(image, path, transparency=TRANSPARENT_INDEX)
+        print(f"Indexed spritesheet saved at {path}")
+
+    palette_path = output_dir.joinpath("palette.json")
+    write_palette_file(palette_path, colors, list(indexed))
+    print(f"Palette with {len(colors)} colours saved at {palette_path}")
+
+
+def entrypoint(
+    config: AnimSpriteConfig,
+    toplevel_output_dir: Path,
+    log_path: Path,
+    png: PngConfig | None = None,
+):
+    output_dir = toplevel_output_dir.joinpath("spritesheets").joinpath(config.id)
 
     run_with_redirected_logs(
-        log_path, lambda: render_spritesheet(config, output_dir=output_dir)
+        log_path,
+        lambda: render_spritesheet(
+            config, output_dir=output_dir, png=png or PngConfig()
+        ),
     )
@@ -0,0 +1,332 @@
+"""Benchmarks for the render pipelines, built on the assets in `test_files/`.
+
+Each case runs the CLI in a fresh process with `--trace` on a generated
+config, so that Blender state never leaks between cases. Run with
+
+    python -m blender_autorender.bench --output bench.json
+
+and compare against a stored baseline with `--baseline baseline.json`. Pass
+`--write-baseline` to store the results of the run as the new baseline.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+TEST_FILES_DIR = Path(__file__).parent.parent.joinpath("test_files")
+
+# Span names counted as one render (or material bake) each
+RENDER_SPANS = ("render", "bake")
+
+
+@dataclass
+class Case:
+    id: str
+    # Asset config in test_files/ the case is derived from
+    base_config: str
+    overrides: dict[str, Any] = field(default_factory=dict)
+    # Overrides of the top-level `png` settings
+    png: dict[str, Any] = field(default_factory=dict)
+
+
+def sprite_cases(frames: list[int], sizes: list[int], widths: list[int]) -> list[Case]:
+    """One-at-a-time sweeps around the monkey spritesheet config."""
+    cases = [
+        Case(f"monkey-frames{n}", "monkey.json", {"start_frame": 1, "end_frame": 1 + n})
+        for n in frames
+    ]
+    cases += [
+        Case(
+            f"monkey-size{size}",
+            "monkey.json",
+            {"start_frame": 1, "end_frame": 1 + frames[0], "sprite_size": size},
+        )
+        for size in sizes
+    ]
+    cases += [
+        Case(
+            f"monkey-width{width}",
+            "monkey.json",
+            {"start_frame": 1, "end_frame": 1 + frames[0], "sheet_width": width},
+        )
+        for width in widths
+    ]
+    return cases
+
+
+def sprite_worker_cases(workers: list[int]) -> list[Case]:
+    """The monkey spritesheet split into two clips, sweeping the clip worker
+    processes and the image writer processes separately."""
+    clips = {
+        "clips": [
+            {"name": "first", "start_frame": 1, "end_frame": 13},
+            {"name": "second", "start_frame": 13, "end_frame": 25},
+        ]
+    }
+    cases = [
+        Case(f"monkey-clips-workers{n}", "monkey.json", {**clips, "workers": n})
+        for n in workers
+    ]
+    cases += [
+        Case(
+            f"monkey-clips-writers{n}",
+            "monkey.json",
+            clips,
+            png={"writer_processes": n},
+        )
+        for n in workers
+    ]
+    return cases
+
+
+def material_cases(sizes: list[int]) -> list[Case]:
+    return [
+        Case(f"cobblestone-size{size}", "cobblestone.json", {"sprite_size": size})
+        for size in sizes
+    ]
+
+
+def anim_scene_cases(workers: list[int]) -> list[Case]:
+    return [
+        Case(
+            f"animated_human-workers{n}",
+            "animated_human.json",
+            {"split_actions": True, "workers": n},
+        )
+        for n in workers
+    ]
+
+
+def write_case_configs(case: Case, work_dir: Path) -> Path:
+    """Write the asset and top-level configs for a case, returning the latter."""
+    with open(TEST_FILES_DIR.joinpath(case.base_config), "r") as f:
+        asset_config = json.load(f)
+    asset_config.update(case.overrides)
+    asset_config["blend_file_path"] = str(
+        TEST_FILES_DIR.joinpath(asset_config["blend_file_path"]).resolve()
+    )
+
+    asset_config_path = work_dir.joinpath("asset.json")
+    with open(asset_config_path, "w") as f:
+        json.dump(asset_config, f)
+
+    toplevel_path = work_dir.joinpath("autorender.json")
+    with open(toplevel_path, "w") as f:
+        json.dump(
+            {
+                "output_dir": "outputs",
+                "collections": [{"id": "bench", "asset_configs": ["asset.json"]}],
+                "png": case.png,
+            },
+            f,
+        )
+    return toplevel_path
+
+
+def bytes_written(output_dir: Path) -> dict[str, int]:
+    """Bytes written under each output directory, e.g. the per-frame diffuse
+    renders or the final sheets."""
+    written: dict[str, int] = {}
+    for root, dirs, files in os.walk(output_dir):
+        # Caches are reused across runs, they are not part of the output
+        dirs[:] = [d for d in dirs if d != ".cache"]
+        if files:
+            written[os.path.relpath(root, output_dir)] = sum(
+                os.path.getsize(os.path.join(root, f)) for f in files
+            )
+    return written
+
+
+def run_once(case: Case) -> dict[str, Any]:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_dir = Path(temp_dir)
+        toplevel_path = write_case_configs(case, work_dir)
+        trace_path = work_dir.joinpath("trace.json")
+
+        env = dict(os.environ)
+        # Keep Cycles on the CPU so numbers are comparable across machines
+        env["CUDA_VISIBLE_DEVICES"] = ""
+
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "blender_autorender",
+                "-c",
+                str(toplevel_path),
+                "--trace",
+                str(trace_path),
+            ],
+            env=env,
+            stdout=subprocess.DEVNULL,
+        )
+        _, status, rusage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+        if process.returncode != 0:
+            raise RuntimeError(f"Case {case.id} failed with code {process.returncode}")
+
+        with open(trace_path, "r") as f:
+            events = json.load(f)["traceEvents"]
+
+        stages: dict[str, float] = {}
+        renders = 0
+        for event in events:
+            stages[event["name"]] = stages.get(event["name"], 0) + event["dur"] / 1000
+            if event["name"] in RENDER_SPANS:
+                renders += 1
+
+        written = bytes_written(work_dir.joinpath("outputs"))
+        return {
+            "wall_s": wall,
+            "renders": renders,
+            "renders_per_s": renders / wall,
+            # ru_maxrss is in kilobytes on Linux
+            "peak_rss_mb": rusage.ru_maxrss / 1024,
+            "bytes_written": sum(written.values()),
+            "bytes_written_by_dir": written,
+            "stages_ms": stages,
+        }
+
+
+def run_case(case: Case, repeat: int) -> dict[str, Any]:
+    """Run a case several times, keeping the run with the median wall time."""
+    runs = sorted((run_once(case) for _ in range(repeat)), key=lambda r: r["wall_s"])
+    result = runs[len(runs) // 2]
+    result["wall_s_all"] = [r["wall_s"] for r in runs]
+    result["wall_s_stdev"] = (
+        statistics.stdev(result["wall_s_all"]) if len(runs) > 1 else 0.0
+    )
+    return result
+
+
+def compare(
+    results: dict[str, Any], baseline: dict[str, Any], thresholds: dict[str, float]
+) -> list[str]:
+    """Regressions of the results against the baseline.
+
+    Thresholds are the allowed relative growth of each metric, e.g. 0.1 lets
+    a metric grow by 10% before being reported.
+    """
+    regressions: list[str] = []
+    for case_id, base in baseline["cases"].items():
+        current = results["cases"].get(case_id)
+        if current is None:
+            continue
+        for metric, threshold in thresholds.items():
+            if not base.get(metric):
+                continue
+            growth = current[metric] / base[metric] - 1
+            if growth > threshold:
+                regressions.append(
+                    f"{case_id}: {metric} {base[metric]:.3f} -> {current[metric]:.3f} "
+                    f"(+{growth:.1%}, allowed +{threshold:.1%})"
+                )
+    return regressions
+
+
+def print_results(results: dict[str, Any]):
+    header = (
+        f"{'case':<28} {'wall s':>8} {'renders/s':>10} {'peak MB':>9} {'bytes':>11}"
+    )
+    print(header)
+    print("-" * len(header))
+    for case_id, r in results["cases"].items():
+        print(
+            f"{case_id:<28} {r['wall_s']:>8.2f} {r['renders_per_s']:>10.2f} "
+            f"{r['peak_rss_mb']:>9.1f} {r['bytes_written']:>11}"
+        )
+
+
+def parse_int_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Blender AutoRender benchmarks")
+    parser.add_argument("--frames", type=parse_int_list, default=[4, 8, 16])
+    parser.add_argument("--sizes", type=parse_int_list, default=[32, 64, 128])
+    parser.add_argument("--sheet-widths", type=parse_int_list, default=[4, 8])
+    parser.add_argument("--workers", type=parse_int_list, default=[1, 2])
+    parser.add_argument(
+        "--only",
+        help="Run only cases whose id contains this string",
+        type=str,
+        default=None,
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--output", help="Where to write the results", type=Path, default=None
+    )
+    parser.add_argument(
+        "--baseline", help="Baseline results to compare with", type=Path, default=None
+    )
+    parser.add_argument(
+        "--write-baseline",
+        help="Store the results as the new baseline instead of comparing",
+        action="store_true",
+    )
+    parser.add_argument("--max-slowdown", type=float, default=0.10)
+    parser.add_argument("--max-rss-growth", type=float, default=0.10)
+    parser.add_argument("--max-size-growth", type=float, default=0.05)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    cases = (
+        sprite_cases(args.frames, args.sizes, args.sheet_widths)
+        + sprite_worker_cases(args.workers)
+        + material_cases(args.sizes)
+        + anim_scene_cases(args.workers)
+    )
+    if args.only is not None:
+        cases = [c for c in cases if args.only in c.id]
+
+    results: dict[str, Any] = {"cases": {}}
+    for case in cases:
+        print(f"Running {case.id}...", flush=True)
+        results["cases"][case.id] = run_case(case, args.repeat)
+
+    print_results(results)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline is None:
+        return
+    if args.write_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    regressions = compare(
+        results,
+        baseline,
+        {
+            "wall_s": args.max_slowdown,
+            "peak_rss_mb": args.max_rss_growth,
+            "bytes_written": args.max_size_growth,
+        },
+    )
+    for regression in regressions:
+        print(f"❌ {regression}")
+    if regressions:
+        exit(1)
+    print("✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
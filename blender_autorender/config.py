@@ -1,6 +1,22 @@
-from pydantic import BaseModel, Field, RootModel
-from typing import List, Literal
+from pydantic import (
+    AliasChoices,
+    BaseModel,
+    Field,
+    RootModel,
+    field_validator,
+    model_validator,
+)
+from typing import List, Literal, Self
 from pathlib import Path
+import re
+
+from blender_autorender.passes import DEFAULT_PASSES, PASSES
+
+# Outputs that can be produced, see `passes.PASSES`
+PassName = Literal["diffuse", "normal", "depth", "roughness", "metallic", "orm"]
+# Passes that can be quantized to a palette. Only colour passes can share one:
+# normals, depth and material data aren't colours.
+PaletteSheetName = Literal["diffuse"]
 
 
 class ObjConfig(BaseModel):
@@ -12,6 +28,63 @@ class CameraConfig(BaseModel):
     # Options: FRONT, SIDE, TOP
     view: str = "TOP"
     ortho_scale: float = 2
+    # Directions to render, as yaw angles in degrees around the pivot's Z
+    # axis, applied on top of the view. Takes precedence over `directions`.
+    yaw_angles: list[float] | None = None
+    # Number of evenly spaced directions to render, starting at yaw 0
+    directions: int | None = Field(default=None, ge=1)
+    pivot: tuple[float, float, float] = (0.0, 0.0, 0.0)
+    # With several directions, either write each direction's sheets to its
+    # own `direction_<i>/` directory ("per_direction"), or put all directions
+    # in one sheet per pass, each starting on a new row ("combined")
+    layout: Literal["per_direction", "combined"] = "per_direction"
+
+    def yaws(self) -> list[float]:
+        if self.yaw_angles is not None:
+            return self.yaw_angles
+        if self.directions is not None:
+            return [360 * i / self.directions for i in range(self.directions)]
+        return [0.0]
+
+
+class PaletteConfig(BaseModel):
+    # Palette as "#rrggbb" colours, at most 255. If not given, one is computed
+    # from all frames of the quantized sheets.
+    colors: list[str] | None = None
+    # Size of the computed palette. Index 0 is reserved for transparency, so
+    # at most 255 colours fit in an indexed PNG.
+    max_colors: int = Field(default=32, ge=1, le=255)
+    # Pixels with alpha below this (0-255) become fully transparent, the rest
+    # fully opaque
+    alpha_threshold: int = Field(default=128, ge=1, le=255)
+    # Sheets sharing the palette and written as indexed PNGs
+    sheets: list[PaletteSheetName] = Field(default_factory=lambda: ["diffuse"])
+
+    @field_validator("colors")
+    @classmethod
+    def check_colors(cls, colors: list[str] | None) -> list[str] | None:
+        if colors is None:
+            return None
+        for color in colors:
+            if not re.fullmatch(r"#?[0-9a-fA-F]{6}", color):
+                raise ValueError(f"Invalid palette colour {color!r}, expected #rrggbb")
+        if not 1 <= len(colors) <= 255:
+            raise ValueError(
+                f"Palette has {len(colors)} colours, expected between 1 and 255"
+            )
+        return colors
+
+
+class ClipConfig(BaseModel):
+    # Used to name the clip's output directory and its entry in `clips.json`
+    name: str
+    # Actions for this clip, replacing the action of objects with the same
+    # name in the asset's `object_configs`
+    object_configs: list[ObjConfig] = Field(default_factory=list)
+    start_frame: int = 1
+    end_frame: int = 24
+    frame_step: int = Field(default=1, ge=1)
+    include_last_frame: bool = False
 
 
 class AnimSpriteConfig(BaseModel):
@@ -22,13 +95,99 @@ class AnimSpriteConfig(BaseModel):
 
     sprite_size: int  # Size of each sprite (64x64, 128x128, etc.)
     sheet_width: int  # Number of sprites per row in the spritesheet
+    # If set, outputs are only written at each of these sizes, under
+    # `<size>px/`, downsampled from a single render at `sprite_size`, which
+    # must be at least as large
+    output_sizes: list[int] = Field(default_factory=list)
 
     start_frame: int = 1
     end_frame: int = 24
-    frame_step: int = 1
+    frame_step: int = Field(default=1, ge=1)
     include_last_frame: bool = False
     camera: CameraConfig = Field(default_factory=CameraConfig)
     object_configs: list[ObjConfig] = Field(default_factory=list)
+    # Sheets to write. Passes they are assembled from are rendered too, and
+    # passes that can share a render do. "depth" is a 16-bit sheet from the
+    # camera's clip start (black) to its clip end (white).
+    passes: list[PassName] = Field(default_factory=lambda: list(DEFAULT_PASSES))
+    # Deprecated, add "depth" to `passes` instead. If set, it is added there.
+    depth: bool = False
+    # Evaluate rigs, constraints and shape keys once per frame before
+    # rendering, and render every pass from the cached vertex positions
+    geometry_cache: bool = False
+    # If set, the selected sheets are quantized to a shared palette and
+    # written as indexed PNGs, alongside a `palette.json`
+    palette: PaletteConfig | None = None
+    # Named animations rendered from the same loaded file. If empty, the
+    # asset is a single clip made of the frame range and actions above.
+    clips: list[ClipConfig] = Field(default_factory=list)
+    # With clips, either write each clip's frames and sheets to its own
+    # `<clip name>/` directory ("per_clip"), or also stack all clips in one
+    # sheet per pass, each starting on a new row ("atlas"). Both write a
+    # `clips.json` index.
+    clip_layout: Literal["per_clip", "atlas"] = "per_clip"
+    # Worker processes rendering clips in parallel, each loading its own copy
+    # of the blend file
+    workers: int = Field(default=1, ge=1)
+
+    def frames(self) -> list[int]:
+        return list(range(self.start_frame, self.frame_end(), self.frame_step))
+
+    def frame_end(self) -> int:
+        """End of the rendered frame range, exclusive."""
+        return self.end_frame + 1 if self.include_last_frame else self.end_frame
+
+    def clip_configs(self) -> list["AnimSpriteConfig"]:
+        """The asset as one config per clip, without clips of their own."""
+        configs = []
+        for clip in self.clips:
+            actions = {o.object_name: o for o in clip.object_configs}
+            object_configs = [
+                actions.pop(o.object_name, o) for o in self.object_configs
+            ]
+            configs.append(
+                self.model_copy(
+                    update={
+                        "object_configs": object_configs + list(actions.values()),
+                        "start_frame": clip.start_frame,
+                        "end_frame": clip.end_frame,
+                        "frame_step": clip.frame_step,
+                        "include_last_frame": clip.include_last_frame,
+                        "clips": [],
+                    }
+                )
+            )
+        return configs or [self]
+
+    @model_validator(mode="after")
+    def check(self) -> Self:
+        if self.depth and "depth" not in self.passes:
+            self.passes.append("depth")
+        if not self.camera.yaws():
+            raise ValueError("Camera yaw_angles must not be empty")
+        if any(size > self.sprite_size for size in self.output_sizes):
+            raise ValueError("Output sizes must not be larger than sprite_size")
+        if not self.passes:
+            raise ValueError("At least one pass must be configured")
+        if self.palette is not None:
+            missing = set(self.palette.sheets) - set(self.passes)
+            if missing:
+                raise ValueError(
+                    f"Palette sheets {sorted(missing)} are not in the configured passes"
+                )
+        names = [clip.name for clip in self.clips]
+        if len(set(names)) != len(names):
+            raise ValueError("Clip names must be unique")
+        for name, clip_config in zip(names or [None], self.clip_configs()):
+            clip = "" if name is None else f" of clip {name}"
+            if not clip_config.frames():
+                raise ValueError(f"Frame range{clip} is empty")
+            length = clip_config.frame_end() - clip_config.start_frame
+            if length % clip_config.frame_step != 0:
+                raise ValueError(
+                    f"Frame step{clip} does not divide the total number of frames"
+                )
+        return self
 
 
 class MaterialConfig(BaseModel):
@@ -40,10 +199,39 @@ class MaterialConfig(BaseModel):
     material_name: str
     # Size of each sprite (64x64, 128x128, etc.)
     sprite_size: int
+    # If set, outputs are only written at each of these sizes, under
+    # `<size>px/`, downsampled from a single render at `sprite_size`, which
+    # must be at least as large
+    output_sizes: list[int] = Field(default_factory=list)
+    # Textures to write. Passes they are assembled from are baked too.
+    passes: list[PassName] = Field(default_factory=lambda: list(DEFAULT_PASSES))
+
+    @model_validator(mode="after")
+    def check(self) -> Self:
+        if any(size > self.sprite_size for size in self.output_sizes):
+            raise ValueError("Output sizes must not be larger than sprite_size")
+        if not self.passes:
+            raise ValueError("At least one pass must be configured")
+        unsupported = [name for name in self.passes if not PASSES[name].material]
+        if unsupported:
+            raise ValueError(f"Materials can't bake the {', '.join(unsupported)} pass")
+        return self
+
+
+class SimplifyConfig(BaseModel):
+    # Maximum deviation from the baked curve allowed when dropping keys, per
+    # channel type. Rotation is in radians (or quaternion components).
+    location: float = 0.0005
+    rotation: float = 0.0005
+    scale: float = 0.0005
+    other: float = 0.0005
 
 
 class BakeConfig(BaseModel):
     step: int = 1
+    # If set, keys that can be reproduced by interpolating their neighbours are
+    # removed after baking
+    simplify: SimplifyConfig | None = None
 
 
 class ActionConfig(BaseModel):
@@ -51,6 +239,17 @@ class ActionConfig(BaseModel):
     bake_config: BakeConfig
 
 
+class TextureConfig(BaseModel):
+    # Images larger than this along either side are downscaled to fit before
+    # export. None keeps the authored resolution.
+    max_size: int | None = None
+    # Embedded image format, as accepted by the glTF exporter: AUTO, JPEG, WEBP
+    # or NONE
+    image_format: Literal["AUTO", "JPEG", "WEBP", "NONE"] = "AUTO"
+    # Only used for JPEG and WEBP
+    quality: int = 90
+
+
 class AnimSceneConfig(BaseModel):
     variant: Literal["anim_scene"]
     blend_file_path: Path
@@ -58,10 +257,20 @@ class AnimSceneConfig(BaseModel):
     id: str
     object_name: str
     action_configs: List[ActionConfig] = Field(default_factory=list)
+    # If true, write the mesh and skeleton to `skeleton.glb` and each action to
+    # its own file under `animations/`, plus an `index.json` listing them.
+    # Otherwise everything goes in a single `model.glb`.
+    split_actions: bool = False
+    # Number of worker processes used to write the per-action files
+    workers: int = 1
+    texture: TextureConfig = Field(default_factory=TextureConfig)
 
 
 class AssetConfig(RootModel):
-    root: MaterialConfig | AnimSpriteConfig | AnimSceneConfig
+    # Only the model named by `variant` is tried, so errors point at it alone
+    root: MaterialConfig | AnimSpriteConfig | AnimSceneConfig = Field(
+        discriminator="variant"
+    )
 
 
 class AssetCollection(BaseModel):
@@ -70,6 +279,27 @@ class AssetCollection(BaseModel):
     asset_configs: List[Path] = Field(default_factory=list)
 
 
+class PngConfig(BaseModel):
+    # zlib compression level, from 0 (fastest) to 9 (smallest)
+    compress_level: int = Field(default=6, ge=0, le=9)
+    # zlib strategy used when encoding: default, filtered, huffman, rle or fixed
+    strategy: Literal["default", "filtered", "huffman", "rle", "fixed"] = "default"
+    # Background processes encoding and writing images while rendering
+    # continues. Also read from its former name, `writer_threads`.
+    writer_processes: int = Field(
+        default=4,
+        ge=1,
+        validation_alias=AliasChoices("writer_processes", "writer_threads"),
+    )
+    # Images queued for writing before rendering waits for the writers
+    max_pending: int = Field(default=16, ge=1)
+
+
 class TopLevelConfig(BaseModel):
     output_dir: Path = Field(default_factory=lambda: Path("outputs"))
     collections: List[AssetCollection]
+    png: PngConfig = Field(default_factory=PngConfig)
+    # If set, assets are rendered in a worker process which is replaced by a
+    # fresh one whenever its resident memory exceeds this many MiB after an
+    # asset
+    memory_budget_mb: float | None = None
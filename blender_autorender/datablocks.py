@@ -0,0 +1,47 @@
+from typing import Any, TypeVar
+import bpy
+
+bpy: Any
+
+T = TypeVar("T")
+
+
+class TempDataBlocks:
+    """Data-blocks created for a single render or bake.
+
+    Everything tracked is removed on `cleanup` (or when leaving the `with`
+    block), along with the object data of removed objects that nothing else
+    uses, such as the mesh of a bake plane. This keeps memory bounded without
+    relying on a file revert, and leaves other data-blocks alone.
+    """
+
+    def __init__(self):
+        self.blocks: list[tuple[str, Any]] = []
+
+    def track(self, collection: str, block: T) -> T:
+        """Register `block`, which lives in `bpy.data.<collection>`.
+
+        None is accepted and ignored, for helpers that may fail to create one.
+        """
+        if block is not None:
+            self.blocks.append((collection, block))
+        return block
+
+    def cleanup(self):
+        for collection, block in reversed(self.blocks):
+            try:
+                owned = block.data if collection == "objects" else None
+                getattr(bpy.data, collection).remove(block)
+            except ReferenceError:
+                # Already freed, e.g. by a file revert
+                continue
+            if owned is not None and owned.users == 0:
+                bpy.data.batch_remove([owned])
+        self.blocks.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.cleanup()
+        return False
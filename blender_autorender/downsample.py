@@ -0,0 +1,160 @@
+# pyright: basic
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from PIL import Image
+
+# 16-bit depth value of pixels not covered by any object
+DEPTH_BACKGROUND = 65535
+
+
+def area_filter_axis(pixels: np.ndarray, size: int, axis: int) -> np.ndarray:
+    """Box-filter `pixels` down to `size` along `axis`.
+
+    Each destination pixel averages the source pixels it covers, weighted by
+    how much of them it covers. A destination pixel overlaps at most
+    ceil(scale) + 1 source pixels, so the filter is applied as that many
+    weighted gathers, whose cost is linear in the number of source pixels.
+    """
+    pixels = np.moveaxis(pixels, axis, 0)
+    src = pixels.shape[0]
+    scale = src / size
+    starts = np.arange(size, dtype=np.float64) * scale
+    ends = starts + scale
+    first = np.floor(starts).astype(np.intp)
+    shape = (size,) + (1,) * (pixels.ndim - 1)
+
+    filtered = np.zeros((size,) + pixels.shape[1:], dtype=np.float32)
+    for tap in range(int(np.ceil(scale)) + 1):
+        index = np.minimum(first + tap, src - 1)
+        overlap = np.minimum(ends, index + 1) - np.maximum(starts, index)
+        weight = np.where(first + tap < src, np.clip(overlap, 0.0, None), 0.0)
+        filtered += (weight / scale).astype(np.float32).reshape(shape) * pixels[index]
+    return np.moveaxis(filtered, 0, axis)
+
+
+def area_filter(pixels: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Box-filter a (h, w, c) float array down to (height, width, c)."""
+    return area_filter_axis(area_filter_axis(pixels, height, 0), width, 1)
+
+
+def srgb_to_linear(values: np.ndarray) -> np.ndarray:
+    return np.where(
+        values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4
+    )
+
+
+def linear_to_srgb(values: np.ndarray) -> np.ndarray:
+    values = np.clip(values, 0.0, 1.0)
+    return np.where(
+        values <= 0.0031308, values * 12.92, 1.055 * values ** (1 / 2.4) - 0.055
+    )
+
+
+def downsample_color(
+    pixels: np.ndarray, width: int, height: int, srgb: bool = False
+) -> np.ndarray:
+    """Downsample straight-alpha RGBA uint8 data with premultiplied alpha, so
+    that transparent pixels don't bleed their colour into the edges.
+
+    Colours are averaged in linear space. Frames rendered with the Raw view
+    transform are linear already; `srgb` data, like material bakes, is
+    decoded first and encoded again afterwards.
+    """
+    data = pixels.astype(np.float32) / 255.0
+    rgb = srgb_to_linear(data[..., :3]) if srgb else data[..., :3]
+    alpha = data[..., 3:4]
+    filtered = area_filter(np.concatenate([rgb * alpha, alpha], axis=2), width, height)
+    alpha = filtered[..., 3:4]
+    rgb = np.where(alpha > 0, filtered[..., :3] / np.maximum(alpha, 1e-8), 0.0)
+    if srgb:
+        rgb = linear_to_srgb(rgb)
+    out = np.concatenate([rgb, alpha], axis=2)
+    return np.clip(out * 255.0 + 0.5, 0, 255).astype(np.uint8)
+
+
+def downsample_normals(pixels: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Downsample an RGBA normal map, averaging the decoded vectors weighted
+    by coverage and renormalizing them."""
+    data = pixels.astype(np.float32) / 255.0
+    alpha = data[..., 3:4]
+    normals = data[..., :3] * 2.0 - 1.0
+    filtered = area_filter(
+        np.concatenate([normals * alpha, alpha], axis=2), width, height
+    )
+    alpha = filtered[..., 3:4]
+    normals = filtered[..., :3]
+    normals /= np.maximum(np.linalg.norm(normals, axis=2, keepdims=True), 1e-8)
+    rgb = np.where(alpha > 0, normals * 0.5 + 0.5, 0.0)
+    out = np.concatenate([rgb, alpha], axis=2)
+    return np.clip(out * 255.0 + 0.5, 0, 255).astype(np.uint8)
+
+
+def downsample_depth(pixels: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Downsample a 16-bit depth map, averaging only covered pixels."""
+    depth = pixels.astype(np.float32)[..., None]
+    covered = (pixels != DEPTH_BACKGROUND).astype(np.float32)[..., None]
+    filtered = area_filter(
+        np.concatenate([depth * covered, covered], axis=2), width, height
+    )
+    coverage = filtered[..., 1]
+    out = np.where(
+        coverage > 0, filtered[..., 0] / np.maximum(coverage, 1e-8), DEPTH_BACKGROUND
+    )
+    return np.clip(out + 0.5, 0, DEPTH_BACKGROUND).astype(np.uint16)
+
+
+def downsample_image(
+    image: Image.Image, scale: float, kind: str, srgb: bool = False
+) -> Image.Image:
+    """Downsample a sprite, sheet or texture by `scale` (below 1).
+
+    `kind` is the name of the pass it holds: normal maps are renormalized,
+    depth maps ignore uncovered pixels, and everything else, including the
+    ORM, roughness and metallic data, is treated as RGBA, linear unless
+    `srgb` is set.
+    """
+    width = max(1, round(image.width * scale))
+    height = max(1, round(image.height * scale))
+    if kind == "depth" and image.mode == "I;16":
+        pixels = np.asarray(image, dtype=np.uint16)
+        return Image.fromarray(downsample_depth(pixels, width, height))
+
+    pixels = np.asarray(image.convert("RGBA"), dtype=np.uint8)
+    if kind == "normal":
+        return Image.fromarray(downsample_normals(pixels, width, height), mode="RGBA")
+    return Image.fromarray(
+        downsample_color(pixels, width, height, srgb=srgb), mode="RGBA"
+    )
+
+
+def size_dir_name(size: int) -> str:
+    return f"{size}px"
+
+
+def write_downsampled(
+    image_path: Path,
+    output_dir: Path,
+    render_size: int,
+    sizes: list[int],
+    save_options: dict[str, Any] | None = None,
+    srgb: bool = False,
+):
+    """Write `image_path`, rendered at `render_size`, to `<size>px/` under
+    `output_dir` for each of `sizes`, in the same mode as the original.
+
+    `srgb` tells colour values are sRGB-encoded, see `downsample_color`.
+    """
+    with Image.open(image_path) as image:
+        image.load()
+    for size in sizes:
+        path = output_dir.joinpath(size_dir_name(size), image_path.name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        sized = image
+        if size != render_size:
+            sized = downsample_image(
+                image, size / render_size, image_path.stem, srgb=srgb
+            )
+            sized = sized.convert(image.mode)
+        sized.save(path, **(save_options or {}))
@@ -0,0 +1,146 @@
+import json
+import shutil
+from pathlib import Path
+from typing import Any
+
+import bpy
+import numpy as np
+
+bpy: Any
+
+
+class GeometryCache:
+    """Deformed vertex positions and world matrices of the animated meshes,
+    per frame, stored as one `.npy` file per object.
+
+    The files are memory-mapped, so only the frames being rendered are
+    paged in, however heavy the meshes.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+        with open(cache_dir.joinpath("index.json"), "r") as f:
+            index = json.load(f)
+        self.frames: list[int] = index["frames"]
+        self.positions = {
+            name: np.load(cache_dir.joinpath(file_name), mmap_mode="r")
+            for name, file_name in index["objects"].items()
+        }
+        self.matrices = np.load(cache_dir.joinpath("matrices.npy"), mmap_mode="r")
+
+    def apply(self, frame: int):
+        """Replace the deformation of the cached meshes by their positions at
+        `frame`, so that evaluating the scene no longer runs their rigs.
+
+        Must be called again after every file revert.
+        """
+        from mathutils import Matrix
+
+        i = self.frames.index(frame)
+        for m, (name, positions) in enumerate(self.positions.items()):
+            obj = bpy.data.objects.get(name)
+            for modifier in obj.modifiers:
+                modifier.show_viewport = False
+                modifier.show_render = False
+            if obj.data.users > 1:
+                # Don't move other objects sharing the mesh
+                obj.data = obj.data.copy()
+            if obj.data.shape_keys is not None:
+                obj.shape_key_clear()
+            obj.constraints.clear()
+            obj.animation_data_clear()
+            obj.parent = None
+            obj.matrix_world = Matrix(self.matrices[m, i].tolist())
+            obj.data.vertices.foreach_set(
+                "co", np.ascontiguousarray(positions[i], dtype=np.float32).ravel()
+            )
+            obj.data.update()
+
+        # Rigs only driving cached meshes don't need to be evaluated anymore
+        live = [
+            o
+            for o in bpy.context.scene.objects
+            if o.type == "MESH" and o.name not in self.positions
+        ]
+        needed = {o.parent for o in live if o.parent is not None}
+        needed |= {
+            m.object
+            for o in live
+            for m in o.modifiers
+            if m.type == "ARMATURE" and m.object is not None
+        }
+        for obj in bpy.context.scene.objects:
+            if obj.type == "ARMATURE" and obj not in needed:
+                obj.animation_data_clear()
+
+    def remove(self):
+        self.positions.clear()
+        del self.matrices
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+def bake_geometry_cache(frames: list[int], cache_dir: Path) -> GeometryCache:
+    """Evaluate the scene once per frame and store the deformed positions of
+    every rendered mesh that moves or deforms over `frames`.
+
+    Meshes whose modifiers change the vertex count can't be replayed on their
+    own topology, so they are left out and keep being evaluated live.
+    """
+    scene = bpy.context.scene
+    objects = [o for o in scene.objects if o.type == "MESH" and not o.hide_render]
+    counts = {o.name: len(o.data.vertices) for o in objects}
+    positions = {
+        o.name: np.empty((len(frames), counts[o.name], 3), dtype=np.float32)
+        for o in objects
+    }
+    matrices = {
+        o.name: np.empty((len(frames), 4, 4), dtype=np.float32) for o in objects
+    }
+
+    for i, frame in enumerate(frames):
+        scene.frame_set(frame)
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+        for obj in objects:
+            if obj.name not in positions:
+                continue
+            evaluated = obj.evaluated_get(depsgraph)
+            mesh = evaluated.to_mesh()
+            try:
+                if len(mesh.vertices) != counts[obj.name]:
+                    print(
+                        f"Not caching {obj.name}: its modifiers change the vertex count"
+                    )
+                    del positions[obj.name]
+                    continue
+                co = np.empty(counts[obj.name] * 3, dtype=np.float32)
+                mesh.vertices.foreach_get("co", co)
+                positions[obj.name][i] = co.reshape(-1, 3)
+                matrices[obj.name][i] = np.array(evaluated.matrix_world)
+            finally:
+                evaluated.to_mesh_clear()
+
+    # Static meshes render the same without the cache
+    animated = [
+        name
+        for name, p in positions.items()
+        if not (np.all(p == p[0]) and np.all(matrices[name] == matrices[name][0]))
+    ]
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    objects_index = {}
+    for m, name in enumerate(animated):
+        file_name = f"{m}.npy"
+        np.save(cache_dir.joinpath(file_name), positions[name])
+        objects_index[name] = file_name
+    np.save(
+        cache_dir.joinpath("matrices.npy"),
+        (
+            np.stack([matrices[name] for name in animated])
+            if animated
+            else np.empty((0, len(frames), 4, 4), dtype=np.float32)
+        ),
+    )
+    with open(cache_dir.joinpath("index.json"), "w") as f:
+        json.dump({"frames": frames, "objects": objects_index}, f)
+    print(f"Cached {len(animated)} animated meshes over {len(frames)} frames")
+    return GeometryCache(cache_dir)
@@ -0,0 +1,252 @@
+# pyright: basic
+import json
+import multiprocessing
+import re
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+GLB_MAGIC = b"glTF"
+GLB_VERSION = 2
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+Gltf = dict[str, Any]
+
+# Node properties dropped from animation files, which only keep the hierarchy
+NODE_ATTACHMENTS = ("mesh", "skin", "camera", "weights", "extensions")
+
+
+def read_glb(path: Path) -> tuple[Gltf, bytes]:
+    data = path.read_bytes()
+    magic, version, length = struct.unpack_from("<4sII", data, 0)
+    if magic != GLB_MAGIC or version != GLB_VERSION:
+        raise ValueError(f"{path} is not a glTF 2.0 binary file")
+
+    gltf: Gltf | None = None
+    binary = b""
+    offset = 12
+    while offset < length:
+        chunk_length, chunk_type = struct.unpack_from("<II", data, offset)
+        chunk = data[offset + 8 : offset + 8 + chunk_length]
+        if chunk_type == CHUNK_JSON:
+            gltf = json.loads(chunk)
+        elif chunk_type == CHUNK_BIN:
+            binary = chunk
+        offset += 8 + chunk_length
+
+    if gltf is None:
+        raise ValueError(f"{path} has no JSON chunk")
+    return gltf, binary
+
+
+def _pad(data: bytes, fill: bytes) -> bytes:
+    return data + fill * (-len(data) % 4)
+
+
+def write_glb(path: Path, gltf: Gltf, binary: bytes):
+    json_chunk = _pad(json.dumps(gltf, separators=(",", ":")).encode(), b" ")
+    bin_chunk = _pad(binary, b"\0")
+
+    length = 12 + 8 + len(json_chunk)
+    if bin_chunk:
+        length += 8 + len(bin_chunk)
+
+    with open(path, "wb") as f:
+        f.write(struct.pack("<4sII", GLB_MAGIC, GLB_VERSION, length))
+        f.write(struct.pack("<II", len(json_chunk), CHUNK_JSON))
+        f.write(json_chunk)
+        if bin_chunk:
+            f.write(struct.pack("<II", len(bin_chunk), CHUNK_BIN))
+            f.write(bin_chunk)
+
+
+def _accessor_refs(gltf: Gltf) -> list[tuple[dict[str, Any], str]]:
+    """All (container, key) pairs in the document that hold an accessor index."""
+    refs: list[tuple[dict[str, Any], str]] = []
+    for mesh in gltf.get("meshes", []):
+        for primitive in mesh["primitives"]:
+            attributes = primitive.get("attributes", {})
+            refs.extend((attributes, k) for k in attributes)
+            if "indices" in primitive:
+                refs.append((primitive, "indices"))
+            for target in primitive.get("targets", []):
+                refs.extend((target, k) for k in target)
+    for skin in gltf.get("skins", []):
+        if "inverseBindMatrices" in skin:
+            refs.append((skin, "inverseBindMatrices"))
+    for animation in gltf.get("animations", []):
+        for sampler in animation["samplers"]:
+            refs.append((sampler, "input"))
+            refs.append((sampler, "output"))
+    return refs
+
+
+def _buffer_view_refs(gltf: Gltf) -> list[tuple[dict[str, Any], str]]:
+    """All (container, key) pairs in the document that hold a buffer view index."""
+    refs: list[tuple[dict[str, Any], str]] = []
+    for accessor in gltf.get("accessors", []):
+        if "bufferView" in accessor:
+            refs.append((accessor, "bufferView"))
+        sparse = accessor.get("sparse")
+        if sparse is not None:
+            refs.append((sparse["indices"], "bufferView"))
+            refs.append((sparse["values"], "bufferView"))
+    for image in gltf.get("images", []):
+        if "bufferView" in image:
+            refs.append((image, "bufferView"))
+    for mesh in gltf.get("meshes", []):
+        for primitive in mesh["primitives"]:
+            draco = primitive.get("extensions", {}).get("KHR_draco_mesh_compression")
+            if draco is not None:
+                refs.append((draco, "bufferView"))
+    return refs
+
+
+def _remap(refs: list[tuple[dict[str, Any], str]], items: list[Any]) -> list[Any]:
+    """Keep only the referenced items, rewriting the references to match."""
+    used = sorted({container[key] for container, key in refs})
+    new_index = {old: new for new, old in enumerate(used)}
+    for container, key in refs:
+        container[key] = new_index[container[key]]
+    return [items[i] for i in used]
+
+
+def compact(gltf: Gltf, binary: bytes) -> tuple[Gltf, bytes]:
+    """Drop accessors, buffer views and binary data no longer referenced.
+
+    Assumes a single buffer, as written by the Blender exporter for GLB files.
+    """
+    gltf["accessors"] = _remap(_accessor_refs(gltf), gltf.get("accessors", []))
+    buffer_views = _remap(_buffer_view_refs(gltf), gltf.get("bufferViews", []))
+
+    new_binary = bytearray()
+    for view in buffer_views:
+        start = view.get("byteOffset", 0)
+        chunk = binary[start : start + view["byteLength"]]
+        new_binary += b"\0" * (-len(new_binary) % 4)
+        view["buffer"] = 0
+        view["byteOffset"] = len(new_binary)
+        new_binary += chunk
+    gltf["bufferViews"] = buffer_views
+    gltf["buffers"] = [{"byteLength": len(new_binary)}] if new_binary else []
+
+    for key in ("accessors", "bufferViews", "buffers"):
+        if not gltf[key]:
+            del gltf[key]
+    return gltf, bytes(new_binary)
+
+
+def skeleton_document(gltf: Gltf, binary: bytes) -> tuple[Gltf, bytes]:
+    """The scene with meshes, skins and materials, but no animations."""
+    skeleton = json.loads(json.dumps(gltf))
+    skeleton.pop("animations", None)
+    return compact(skeleton, binary)
+
+
+def animation_document(
+    gltf: Gltf, binary: bytes, animation_index: int
+) -> tuple[Gltf, bytes]:
+    """A document holding a single animation.
+
+    The source nodes and scenes are kept, without meshes, skins or cameras,
+    so that the file is valid on its own and channel targets keep the node
+    indices of the matching skeleton document.
+    """
+    document: Gltf = {
+        "asset": gltf["asset"],
+        "nodes": [
+            {k: v for k, v in node.items() if k not in NODE_ATTACHMENTS}
+            for node in gltf.get("nodes", [])
+        ],
+        "animations": [gltf["animations"][animation_index]],
+        "accessors": gltf.get("accessors", []),
+        "bufferViews": gltf.get("bufferViews", []),
+    }
+    for key in ("scenes", "scene"):
+        if key in gltf:
+            document[key] = gltf[key]
+    return compact(json.loads(json.dumps(document)), binary)
+
+
+def animation_file_name(name: str, taken: set[str]) -> str:
+    """File name for an animation, not in `taken`, which it is added to.
+
+    Names are compared case-insensitively, so that files don't collide on
+    case-insensitive file systems either.
+    """
+    stem = re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+    file_name = f"{stem}.glb"
+    suffix = 2
+    while file_name.lower() in taken:
+        file_name = f"{stem}_{suffix}.glb"
+        suffix += 1
+    taken.add(file_name.lower())
+    return file_name
+
+
+def animation_duration(gltf: Gltf, animation: dict[str, Any]) -> float:
+    """Time between the first and the last keyframe of any channel."""
+    accessors = gltf.get("accessors", [])
+    inputs = [accessors[s["input"]] for s in animation["samplers"]]
+    if not inputs:
+        return 0.0
+    start = min(a.get("min", [0.0])[0] for a in inputs)
+    end = max(a.get("max", [0.0])[0] for a in inputs)
+    return end - start
+
+
+def _write_animation(source: Path, animation_index: int, output_path: Path):
+    gltf, binary = read_glb(source)
+    write_glb(output_path, *animation_document(gltf, binary, animation_index))
+
+
+def split_glb(
+    source: Path,
+    output_dir: Path,
+    skeleton_name: str = "skeleton.glb",
+    workers: int = 1,
+) -> Path:
+    """Split a GLB into a skeleton file plus one file per animation.
+
+    Writes an `index.json` next to the outputs describing the files, and
+    returns its path.
+    """
+    gltf, binary = read_glb(source)
+    animations_dir = output_dir.joinpath("animations")
+    animations_dir.mkdir(parents=True, exist_ok=True)
+
+    write_glb(output_dir.joinpath(skeleton_name), *skeleton_document(gltf, binary))
+
+    jobs: list[tuple[int, Path]] = []
+    entries: list[dict[str, Any]] = []
+    file_names: set[str] = set()
+    for i, animation in enumerate(gltf.get("animations", [])):
+        name = animation.get("name", f"animation_{i}")
+        path = animations_dir.joinpath(animation_file_name(name, file_names))
+        jobs.append((i, path))
+        entries.append(
+            {
+                "name": name,
+                "file": str(path.relative_to(output_dir)),
+                "duration": animation_duration(gltf, animation),
+            }
+        )
+
+    if workers > 1 and len(jobs) > 1:
+        # Spawn rather than fork, the parent process usually has bpy loaded
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            futures = [pool.submit(_write_animation, source, i, p) for i, p in jobs]
+            for future in futures:
+                future.result()
+    else:
+        for i, path in jobs:
+            write_glb(path, *animation_document(gltf, binary, i))
+
+    index_path = output_dir.joinpath("index.json")
+    with open(index_path, "w") as f:
+        json.dump({"skeleton": skeleton_name, "animations": entries}, f, indent=2)
+    return index_path
@@ -0,0 +1,120 @@
+# pyright: basic
+from typing import Any
+
+import numpy as np
+
+from blender_autorender.config import SimplifyConfig
+
+FCurve = Any
+Action = Any
+
+# Value of the LINEAR item in Blender's keyframe interpolation enum
+KEYFRAME_INTERPOLATION_LINEAR = 1
+
+
+def channel_tolerance(config: SimplifyConfig, data_path: str) -> float:
+    if data_path.endswith("location"):
+        return config.location
+    elif data_path.endswith(("rotation_quaternion", "rotation_euler")):
+        return config.rotation
+    elif data_path.endswith("scale"):
+        return config.scale
+    else:
+        return config.other
+
+
+def reduce_keyframes(
+    frames: np.ndarray, values: np.ndarray, tolerance: float
+) -> np.ndarray:
+    """Return a mask of the keys needed to reproduce a sampled curve.
+
+    A key is dropped when linearly interpolating between its kept neighbours
+    stays within `tolerance` of every original sample in between. Each pass
+    only drops keys with the same index parity, so the removed keys never share
+    a segment and the error bound holds for the resulting curve.
+    """
+    n = len(frames)
+    keep = np.ones(n, dtype=bool)
+    samples = np.arange(n)
+    parity = 0
+    idle_passes = 0
+
+    while idle_passes < 2:
+        kept = np.flatnonzero(keep)
+        m = len(kept)
+        if m <= 2:
+            break
+
+        # Every sample lies in the segment kept[seg] .. kept[seg + 1], which is
+        # covered by the windows of the candidates at `seg` and `seg + 1`
+        seg = np.minimum(np.searchsorted(kept, samples, side="right") - 1, m - 2)
+        errors = np.zeros(m)
+        for offset in (0, 1):
+            candidate = seg + offset
+            valid = (candidate >= 1) & (candidate <= m - 2)
+            candidate = candidate[valid]
+            sample = samples[valid]
+            start = kept[candidate - 1]
+            end = kept[candidate + 1]
+            t = (frames[sample] - frames[start]) / (frames[end] - frames[start])
+            approx = values[start] + t * (values[end] - values[start])
+            np.maximum.at(errors, candidate, np.abs(values[sample] - approx))
+
+        positions = np.arange(m)
+        removable = (
+            (positions >= 1)
+            & (positions <= m - 2)
+            & (positions % 2 == parity)
+            & (errors <= tolerance)
+        )
+        if removable.any():
+            keep[kept[removable]] = False
+            idle_passes = 0
+        else:
+            idle_passes += 1
+        parity ^= 1
+
+    return keep
+
+
+def simplify_fcurve(fcurve: FCurve, tolerance: float) -> tuple[int, int]:
+    """Drop redundant keys from an fcurve, making the remaining ones linear.
+
+    Returns the key count before and after.
+    """
+    points = fcurve.keyframe_points
+    count = len(points)
+    if count <= 2:
+        return count, count
+
+    co = np.empty(count * 2, dtype=np.float32)
+    points.foreach_get("co", co)
+    co = co.reshape(-1, 2)
+
+    keep = reduce_keyframes(
+        co[:, 0].astype(np.float64), co[:, 1].astype(np.float64), tolerance
+    )
+    kept = co[keep]
+
+    points.clear()
+    points.add(len(kept))
+    points.foreach_set("co", kept.ravel())
+    points.foreach_set(
+        "interpolation",
+        np.full(len(kept), KEYFRAME_INTERPOLATION_LINEAR, dtype=np.int32),
+    )
+    fcurve.update()
+
+    return count, len(kept)
+
+
+def simplify_action(action: Action, config: SimplifyConfig) -> tuple[int, int]:
+    total_before = 0
+    total_after = 0
+    for fcurve in action.fcurves:
+        before, after = simplify_fcurve(
+            fcurve, channel_tolerance(config, fcurve.data_path)
+        )
+        total_before += before
+        total_after += after
+    return total_before, total_after
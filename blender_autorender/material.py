@@ -1,6 +1,12 @@
 from pathlib import Path
 from typing import Any
-from blender_autorender.config import MaterialConfig
+from blender_autorender.config import MaterialConfig, PngConfig
+from blender_autorender import progress, trace
+from blender_autorender.datablocks import TempDataBlocks
+from blender_autorender.passes import PASSES, material_bakes, resolve_passes
+from blender_autorender.textures import read_pixels
+from blender_autorender.sheets import traced_write_downsampled
+from blender_autorender.writer import ImageWriter, pil_from_pixels
 from blender_autorender.utils import (
     pack_channels,
     reconnect_bsdf_input,
@@ -12,10 +18,6 @@ import os
 bpy: Any
 
 
-def setup():
-    bpy.ops.wm.revert_mainfile()
-
-
 # Function to create a plane object and assign a material to it
 def create_plane_with_material(material):
     # Create a new plane
@@ -35,9 +37,14 @@ def create_plane_with_material(material):
 
 # Function to bake a given type of texture (e.g., Diffuse, Normal, Roughness)
 def bake_texture(
-    material, config: MaterialConfig, texture_type: str, file_output: Path
+    material,
+    config: MaterialConfig,
+    texture_type: str,
+    file_output: Path,
+    temp: TempDataBlocks,
+    writer: ImageWriter,
 ):
-    obj = create_plane_with_material(material)
+    obj = temp.track("objects", create_plane_with_material(material))
 
     # Set the object to active and ensure it's in Object mode
     bpy.ops.object.select_all(action="DESELECT")  # Deselect all objects
@@ -45,8 +52,11 @@ def bake_texture(
     bpy.context.view_layer.objects.active = obj
 
     # Create a new image for baking
-    image = bpy.data.images.new(
-        f"{texture_type}.png", width=config.sprite_size, height=config.sprite_size
+    image = temp.track(
+        "images",
+        bpy.data.images.new(
+            f"{texture_type}.png", width=config.sprite_size, height=config.sprite_size
+        ),
     )
 
     # Create a new image texture node in the material
@@ -63,94 +73,151 @@ def bake_texture(
     bpy.context.scene.render.bake.use_pass_color = True
 
     # Set bake settings based on the texture type
-    if texture_type == "diffuse":
-        bpy.ops.object.bake(type="DIFFUSE")
-    elif texture_type == "normal":
-        bpy.ops.object.bake(type="NORMAL")
-    elif texture_type == "roughness":
-        bpy.ops.object.bake(type="ROUGHNESS")
-    elif texture_type == "emissive":
-        bpy.ops.object.bake(type="EMIT")
-    else:
-        raise ValueError(f"Unknown texture type: {texture_type}")
-
-    # Save the baked image to file
-    image.filepath_raw = str(file_output)
-    image.file_format = "PNG"
-    image.save()
-
-
-def render_texture(config: MaterialConfig, texture_type: str, file_output):
-    setup()
-
-    material = bpy.data.materials[config.material_name]
-
-    if texture_type == "normal":
-        bake_texture(
-            material=material,
-            config=config,
-            texture_type=texture_type,
-            file_output=file_output,
-        )
-    elif texture_type == "diffuse":
-        material = reconnect_bsdf_input(material, bsdf_input_name="Base Color")
-        bake_texture(
-            material=material,
-            config=config,
-            texture_type="emissive",
-            file_output=file_output,
-        )
-    elif texture_type == "roughness":
-        material = reconnect_bsdf_input(material, bsdf_input_name="Roughness")
-        bake_texture(
-            material=material,
-            config=config,
-            texture_type="emissive",
-            file_output=file_output,
-        )
-    elif texture_type == "metallic":
-        material = reconnect_bsdf_input(material, bsdf_input_name="Metallic")
-        bake_texture(
-            material=material,
-            config=config,
-            texture_type="emissive",
-            file_output=file_output,
-        )
+    with trace.span("bake", asset=config.id, render_pass=file_output.stem):
+        if texture_type == "diffuse":
+            bpy.ops.object.bake(type="DIFFUSE")
+        elif texture_type == "normal":
+            bpy.ops.object.bake(type="NORMAL")
+        elif texture_type == "roughness":
+            bpy.ops.object.bake(type="ROUGHNESS")
+        elif texture_type == "emissive":
+            bpy.ops.object.bake(type="EMIT")
+        else:
+            raise ValueError(f"Unknown texture type: {texture_type}")
+    progress.render_done()
+
+    # Copy the baked pixels out, the encode and write happen in the background
+    # while the next map bakes. Bake images have no alpha, and Blender saved
+    # them as RGB.
+    with trace.span("pixels_readback", asset=config.id, render_pass=file_output.stem):
+        writer.save(pil_from_pixels(read_pixels(image)).convert("RGB"), file_output)
+
+    # The material may be the original one, leave its node tree as we found it
+    nodes.remove(image_node)
+
+
+def render_texture(
+    config: MaterialConfig, texture_type: str, file_output, writer: ImageWriter
+):
+    """Bake one texture. Everything created for it is removed afterwards, so
+    the file needn't be reverted between textures."""
+    with TempDataBlocks() as temp:
+        material = bpy.data.materials[config.material_name]
+
+        if texture_type == "normal":
+            bake_texture(
+                material=material,
+                config=config,
+                texture_type=texture_type,
+                file_output=file_output,
+                temp=temp,
+                writer=writer,
+            )
+        elif texture_type == "diffuse":
+            material = temp.track(
+                "materials",
+                reconnect_bsdf_input(material, bsdf_input_name="Base Color"),
+            )
+            bake_texture(
+                material=material,
+                config=config,
+                texture_type="emissive",
+                file_output=file_output,
+                temp=temp,
+                writer=writer,
+            )
+        elif texture_type == "roughness":
+            material = temp.track(
+                "materials", reconnect_bsdf_input(material, bsdf_input_name="Roughness")
+            )
+            bake_texture(
+                material=material,
+                config=config,
+                texture_type="emissive",
+                file_output=file_output,
+                temp=temp,
+                writer=writer,
+            )
+        elif texture_type == "metallic":
+            material = temp.track(
+                "materials", reconnect_bsdf_input(material, bsdf_input_name="Metallic")
+            )
+            bake_texture(
+                material=material,
+                config=config,
+                texture_type="emissive",
+                file_output=file_output,
+                temp=temp,
+                writer=writer,
+            )
 
 
 # Main function to bake and save all maps
-def bake_material_maps(config: MaterialConfig, output_dir: Path):
-    bpy.ops.wm.open_mainfile(filepath=str(config.blend_file_path))
+def bake_material_maps(config: MaterialConfig, output_dir: Path, png: PngConfig):
+    with trace.span("open_file", asset=config.id):
+        bpy.ops.wm.open_mainfile(filepath=str(config.blend_file_path))
 
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    diffuse_path = output_dir.joinpath("diffuse.png")
-    normal_path = output_dir.joinpath("normal.png")
-    roughness_path = output_dir.joinpath("roughness.png")
-    metallic_path = output_dir.joinpath("metallic.png")
-
-    render_texture(config=config, texture_type="diffuse", file_output=diffuse_path)
-    render_texture(config=config, texture_type="normal", file_output=normal_path)
-    render_texture(config=config, texture_type="roughness", file_output=roughness_path)
-    render_texture(config=config, texture_type="metallic", file_output=metallic_path)
-
-    pack_channels(
-        None,
-        roughness_path,
-        metallic_path,
-        output_file_name="orm.png",
-        img_size=config.sprite_size,
-        output_dir=output_dir,
-    )
+    paths = {name: output_dir.joinpath(f"{name}.png") for name in PASSES}
+
+    # Downsampling runs on the same writer processes as the bakes' encoding
+    with ImageWriter(png) as writer:
+        for texture_type in material_bakes(config.passes):
+            render_texture(
+                config=config,
+                texture_type=texture_type,
+                file_output=paths[texture_type],
+                writer=writer,
+            )
+        writer.wait()
+
+        for name in resolve_passes(config.passes):
+            channels = PASSES[name].packed_channels
+            if channels is None:
+                continue
+            red, green, blue = (paths[c] if c else None for c in channels)
+            with trace.span("pack_channels", asset=config.id, render_pass=name):
+                pack_channels(
+                    red,
+                    green,
+                    blue,
+                    output_file_name=paths[name].name,
+                    img_size=config.sprite_size,
+                    output_dir=output_dir,
+                    save_options=writer.save_options,
+                )
+
+        # Textures only baked for others to be assembled from aren't outputs
+        for name in resolve_passes(config.passes):
+            if name not in config.passes:
+                paths[name].unlink(missing_ok=True)
+
+        if config.output_sizes:
+            for name in config.passes:
+                writer.submit(
+                    traced_write_downsampled,
+                    config,
+                    paths[name],
+                    output_dir,
+                    save_options=writer.save_options,
+                )
 
     return
 
 
 def entrypoint_material(
-    config: MaterialConfig, toplevel_output_dir: Path, log_path: Path
+    config: MaterialConfig,
+    toplevel_output_dir: Path,
+    log_path: Path,
+    png: PngConfig | None = None,
 ):
     output_dir = toplevel_output_dir.joinpath("materials").joinpath(config.id)
+
     run_with_redirected_logs(
-        log_path, lambda: bake_material_maps(config, output_dir=output_dir)
+        log_path,
+        lambda: bake_material_maps(
+            config, output_dir=output_dir, png=png or PngConfig()
+        ),
     )
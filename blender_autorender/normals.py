@@ -0,0 +1,41 @@
+# pyright: basic
+import numpy as np
+
+
+def camera_space_normals(
+    world_normals: np.ndarray, camera_rotation: np.ndarray
+) -> np.ndarray:
+    """Rotate (h, w, 3) world-space normals into camera space.
+
+    `camera_rotation` is the 3x3 rotation of the camera's world matrix, whose
+    columns are the camera axes in world space. Blender cameras look down
+    their -Z axis, so normals facing the camera end up with positive Z.
+    """
+    # Row vectors times R is R^T applied to each normal
+    normals = world_normals @ np.asarray(camera_rotation, dtype=np.float32)
+    length = np.linalg.norm(normals, axis=-1, keepdims=True)
+    return normals / np.maximum(length, 1e-8)
+
+
+def encode_normals(
+    world_normals: np.ndarray, camera_rotation: np.ndarray, alpha: np.ndarray
+) -> np.ndarray:
+    """Camera-space normal map as (h, w, 4) uint8, mapping [-1, 1] to [0, 255].
+
+    Pixels where `alpha` is 0 are left black.
+    """
+    normals = camera_space_normals(world_normals, camera_rotation)
+    rgb = np.clip((normals * 0.5 + 0.5) * 255.0 + 0.5, 0, 255).astype(np.uint8)
+    rgb[alpha == 0] = 0
+    return np.dstack([rgb, alpha.astype(np.uint8)])
+
+
+def encode_depth(
+    depth: np.ndarray, alpha: np.ndarray, clip_start: float, clip_end: float
+) -> np.ndarray:
+    """Linear depth as (h, w) uint16, from the camera's clip start (0) to its
+    clip end (65535). Background pixels are at the clip end."""
+    normalized = (depth - clip_start) / max(clip_end - clip_start, 1e-8)
+    normalized = np.clip(normalized, 0.0, 1.0)
+    normalized[alpha == 0] = 1.0
+    return (normalized * 65535.0 + 0.5).astype(np.uint16)
@@ -0,0 +1,147 @@
+# pyright: basic
+import json
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from blender_autorender.config import PaletteConfig
+
+# Index of the fully transparent entry in indexed images
+TRANSPARENT_INDEX = 0
+
+# Distinct colours compared against the palette at once, to bound the size
+# of the distance matrix
+NEAREST_CHUNK = 4096
+
+
+def parse_color(value: str) -> tuple[int, int, int]:
+    """Parse a "#rrggbb" colour, as checked by `PaletteConfig`."""
+    digits = value.removeprefix("#")
+    return int(digits[0:2], 16), int(digits[2:4], 16), int(digits[4:6], 16)
+
+
+def format_color(color: np.ndarray) -> str:
+    return "#{:02x}{:02x}{:02x}".format(*(int(c) for c in color))
+
+
+def pack_rgb(rgb: np.ndarray) -> np.ndarray:
+    """Pack (n, 3) uint8 colours into one uint32 each, for fast `np.unique`."""
+    rgb = rgb.astype(np.uint32)
+    return (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+
+
+def unpack_rgb(packed: np.ndarray) -> np.ndarray:
+    return np.stack(
+        [(packed >> 16) & 0xFF, (packed >> 8) & 0xFF, packed & 0xFF], axis=1
+    ).astype(np.uint8)
+
+
+def opaque_pixels(sheets: list[np.ndarray], alpha_threshold: int) -> np.ndarray:
+    """RGB of all pixels of the (h, w, 4) sheets that stay opaque, as (n, 3)."""
+    pixels = [s.reshape(-1, 4) for s in sheets]
+    return np.concatenate(
+        [p[p[:, 3] >= alpha_threshold, :3] for p in pixels]
+        or [np.empty((0, 3), dtype=np.uint8)]
+    )
+
+
+def compute_palette(
+    sheets: list[np.ndarray], max_colors: int, alpha_threshold: int
+) -> np.ndarray:
+    """Palette of at most `max_colors` colours for all opaque pixels of the
+    sheets, as (k, 3) uint8.
+
+    Sheets that already use few enough colours keep them exactly. Otherwise
+    the colours are reduced by median cut over every opaque pixel, so that
+    large areas of one colour weigh more than stray pixels.
+    """
+    rgb = opaque_pixels(sheets, alpha_threshold)
+    unique = np.unique(pack_rgb(rgb))
+    if len(unique) <= max_colors:
+        return unpack_rgb(unique)
+
+    column = Image.fromarray(np.ascontiguousarray(rgb.reshape(-1, 1, 3)), "RGB")
+    quantized = column.quantize(max_colors, method=Image.Quantize.MEDIANCUT)
+    used = sorted(index for _, index in quantized.getcolors(max_colors))
+    palette = np.array(quantized.getpalette()[: 3 * max_colors], dtype=np.uint8)
+    return palette.reshape(-1, 3)[used]
+
+
+def nearest_indices(rgb: np.ndarray, palette: np.ndarray) -> np.ndarray:
+    """Index of the nearest palette colour for each (n, 3) colour.
+
+    Distances are only computed for distinct colours, which are usually far
+    fewer than pixels in a rendered sheet.
+    """
+    unique, inverse = np.unique(pack_rgb(rgb), return_inverse=True)
+    colors = unpack_rgb(unique).astype(np.int32)
+    targets = palette.astype(np.int32)
+    nearest = np.empty(len(unique), dtype=np.intp)
+    for start in range(0, len(unique), NEAREST_CHUNK):
+        chunk = colors[start : start + NEAREST_CHUNK]
+        distances = ((chunk[:, None, :] - targets[None, :, :]) ** 2).sum(axis=2)
+        nearest[start : start + NEAREST_CHUNK] = distances.argmin(axis=1)
+    return nearest[inverse.reshape(-1)]
+
+
+def quantize(sheet: np.ndarray, palette: np.ndarray, alpha_threshold: int):
+    """Map a (h, w, 4) uint8 sheet to palette indices.
+
+    Transparent pixels get `TRANSPARENT_INDEX` and opaque pixels the index of
+    their nearest palette colour, offset by one.
+    """
+    height, width, _ = sheet.shape
+    pixels = sheet.reshape(-1, 4)
+    opaque = pixels[:, 3] >= alpha_threshold
+    indices = np.full(len(pixels), TRANSPARENT_INDEX, dtype=np.uint8)
+    if len(palette) > 0 and opaque.any():
+        indices[opaque] = nearest_indices(pixels[opaque, :3], palette) + 1
+    return indices.reshape(height, width)
+
+
+def indexed_image(indices: np.ndarray, palette: np.ndarray) -> Image.Image:
+    """Palette-mode image whose entry 0 is transparent, followed by `palette`."""
+    image = Image.fromarray(indices, mode="P")
+    entries = np.concatenate([np.zeros((1, 3), dtype=np.uint8), palette])
+    image.putpalette(entries.reshape(-1).tolist(), rawmode="RGB")
+    return image
+
+
+def quantize_sheets(
+    sheets: dict[str, Image.Image], config: PaletteConfig
+) -> tuple[dict[str, Image.Image], np.ndarray]:
+    """Quantize a set of sheets to one shared palette.
+
+    Returns the indexed sheets, keyed like `sheets`, and the palette.
+    """
+    pixels = {
+        name: np.asarray(image.convert("RGBA"), dtype=np.uint8)
+        for name, image in sheets.items()
+    }
+    if config.colors is not None:
+        palette = np.array([parse_color(c) for c in config.colors], dtype=np.uint8)
+    else:
+        palette = compute_palette(
+            list(pixels.values()), config.max_colors, config.alpha_threshold
+        )
+
+    indexed = {
+        name: indexed_image(quantize(p, palette, config.alpha_threshold), palette)
+        for name, p in pixels.items()
+    }
+    return indexed, palette
+
+
+def write_palette_file(path: Path, palette: np.ndarray, sheets: list[str]):
+    """Write the palette as JSON. Colour `i` is index `i + 1` in the sheets."""
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "transparent_index": TRANSPARENT_INDEX,
+                "colors": [format_color(c) for c in palette],
+                "sheets": sheets,
+            },
+            f,
+            indent=2,
+        )
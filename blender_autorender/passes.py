@@ -0,0 +1,90 @@
+from dataclasses import dataclass
+from typing import Iterable
+
+
+@dataclass(frozen=True)
+class PassSpec:
+    name: str
+    # BSDF input rendered as an emissive colour in a render of its own
+    bsdf_input: str | None = None
+    # Read from Cycles' data passes of another pass's render, so it needs no
+    # render of its own
+    data_pass: bool = False
+    # Passes packed into the R, G and B channels to assemble this one, None
+    # leaving a channel at zero
+    packed_channels: tuple[str | None, str | None, str | None] | None = None
+    # Whether material assets can bake it
+    material: bool = True
+
+    @property
+    def depends_on(self) -> tuple[str, ...]:
+        return tuple(p for p in self.packed_channels or () if p is not None)
+
+
+PASSES: dict[str, PassSpec] = {
+    spec.name: spec
+    for spec in (
+        PassSpec("diffuse", bsdf_input="Base Color"),
+        PassSpec("normal", data_pass=True),
+        # 16-bit linear depth between the camera's clip start and end
+        PassSpec("depth", data_pass=True, material=False),
+        PassSpec("roughness", bsdf_input="Roughness"),
+        PassSpec("metallic", bsdf_input="Metallic"),
+        PassSpec("orm", packed_channels=(None, "roughness", "metallic")),
+    )
+}
+
+DEFAULT_PASSES = ["diffuse", "normal", "roughness", "metallic", "orm"]
+
+
+def resolve_passes(requested: Iterable[str]) -> list[str]:
+    """The requested passes and everything they depend on, each after its
+    dependencies."""
+    ordered: list[str] = []
+
+    def visit(name: str):
+        if name in ordered:
+            return
+        for dependency in PASSES[name].depends_on:
+            visit(dependency)
+        ordered.append(name)
+
+    for name in requested:
+        visit(name)
+    return ordered
+
+
+@dataclass(frozen=True)
+class RenderGroup:
+    # Pass whose image the render produces
+    name: str
+    bsdf_input: str
+    # Data passes written from the same render
+    data_passes: tuple[str, ...] = ()
+
+
+def render_groups(requested: Iterable[str]) -> list[RenderGroup]:
+    """Renders needed per frame and direction for the requested passes.
+
+    Data passes ride along with the first render. If no pass needs a render
+    of its own, a diffuse render carries them, since its alpha gives their
+    coverage.
+    """
+    resolved = resolve_passes(requested)
+    data_passes = tuple(n for n in resolved if PASSES[n].data_pass)
+    renders = [n for n in resolved if PASSES[n].bsdf_input is not None]
+    if data_passes and not renders:
+        renders = ["diffuse"]
+    return [
+        RenderGroup(
+            name=name,
+            bsdf_input=PASSES[name].bsdf_input or "",
+            data_passes=data_passes if i == 0 else (),
+        )
+        for i, name in enumerate(renders)
+    ]
+
+
+def material_bakes(requested: Iterable[str]) -> list[str]:
+    """Passes a material asset bakes, the others being assembled from them."""
+    return [n for n in resolve_passes(requested) if PASSES[n].packed_channels is None]
@@ -0,0 +1,122 @@
+from dataclasses import dataclass
+from pathlib import Path
+
+from pydantic import ValidationError
+
+from blender_autorender.config import (
+    TopLevelConfig,
+    AssetConfig,
+    MaterialConfig,
+    AnimSpriteConfig,
+    AnimSceneConfig,
+    PngConfig,
+)
+from blender_autorender.passes import material_bakes, render_groups
+
+
+@dataclass
+class Job:
+    collection_id: str
+    config_path: Path
+    asset: MaterialConfig | AnimSpriteConfig | AnimSceneConfig
+    output_dir: Path
+    png: PngConfig
+
+
+def resolve_path(config_path: Path, potentially_relative_path: Path) -> Path:
+    root = config_path.parent
+    return (
+        potentially_relative_path
+        if Path(potentially_relative_path).is_absolute()
+        else root.joinpath(potentially_relative_path)
+    )
+
+
+def load_toplevel_config(config_path: Path) -> TopLevelConfig:
+    with open(config_path, "r") as f:
+        config_json = f.read()
+    return TopLevelConfig.model_validate_json(config_json)
+
+
+def load_jobs(
+    config_path: Path, config: TopLevelConfig, asset_collection: str | None = None
+) -> tuple[list[Job], list[str]]:
+    """Parse every asset config referenced by the top-level config.
+
+    Paths are resolved relative to the config that mentions them. Problems are
+    collected rather than raised, so that a single pass reports all of them.
+    """
+    output_dir = resolve_path(config_path, config.output_dir)
+    jobs: list[Job] = []
+    errors: list[str] = []
+    for collection in config.collections:
+        if asset_collection is not None and asset_collection != collection.id:
+            continue
+
+        for asset_config_path in collection.asset_configs:
+            asset_config_path = resolve_path(config_path, asset_config_path)
+            try:
+                with open(asset_config_path, "r") as f:
+                    asset_config_json = f.read()
+                asset_config: AssetConfig = AssetConfig.model_validate_json(
+                    asset_config_json
+                )
+            except (OSError, ValidationError) as e:
+                errors.append(f"{asset_config_path}: {e}")
+                continue
+
+            asset = asset_config.root
+            asset.blend_file_path = resolve_path(
+                asset_config_path, asset.blend_file_path
+            )
+            if not asset.blend_file_path.is_file():
+                errors.append(
+                    f"{asset_config_path}: blend file {asset.blend_file_path} not found"
+                )
+
+            jobs.append(
+                Job(
+                    collection_id=collection.id,
+                    config_path=asset_config_path,
+                    asset=asset,
+                    output_dir=output_dir.joinpath(collection.id),
+                    png=config.png,
+                )
+            )
+    return jobs, errors
+
+
+def estimate(job: Job) -> tuple[int | None, int]:
+    """Estimated (frame count, render count) for a job.
+
+    The frame count of anim_scene jobs depends on the actions in the blend
+    file, so it is unknown until the file is loaded.
+    """
+    asset = job.asset
+    if isinstance(asset, AnimSpriteConfig):
+        frames = sum(len(clip.frames()) for clip in asset.clip_configs())
+        directions = len(asset.camera.yaws())
+        renders_per_frame = len(render_groups(asset.passes))
+        return frames, frames * directions * renders_per_frame
+    elif isinstance(asset, MaterialConfig):
+        return 1, len(material_bakes(asset.passes))
+    else:
+        return None, 0
+
+
+def print_plan(jobs: list[Job]):
+    header = f"{'collection':<20} {'asset':<24} {'variant':<12} {'frames':>7} {'renders':>8}  blend file"
+    print(header)
+    print("-" * len(header))
+    total_frames = 0
+    total_renders = 0
+    for job in jobs:
+        frames, renders = estimate(job)
+        total_frames += frames or 0
+        total_renders += renders
+        print(
+            f"{job.collection_id:<20} {job.asset.id:<24} {job.asset.variant:<12} "
+            f"{'-' if frames is None else frames:>7} {renders:>8}  {job.asset.blend_file_path}"
+        )
+    print("-" * len(header))
+    print(f"{len(jobs)} jobs, {total_frames} frames, {total_renders} renders/bakes")
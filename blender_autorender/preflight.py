@@ -0,0 +1,86 @@
+import hashlib
+import json
+from pathlib import Path
+
+from blender_autorender.config import (
+    MaterialConfig,
+    AnimSpriteConfig,
+    AnimSceneConfig,
+)
+from blender_autorender.plan import Job
+
+# Data-block collections listed for each blend file
+LISTED_COLLECTIONS = ("objects", "actions", "materials")
+
+DataBlockNames = dict[str, set[str]]
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def list_datablocks(blend_file: Path, cache_dir: Path) -> DataBlockNames:
+    """Names of the data-blocks in a blend file, without loading the file.
+
+    Results are cached on disk by file hash.
+    """
+    cache_path = cache_dir.joinpath(f"{file_hash(blend_file)}.json")
+    if cache_path.exists():
+        with open(cache_path, "r") as f:
+            cached = json.load(f)
+        return {k: set(v) for k, v in cached.items()}
+
+    import bpy
+
+    with bpy.data.libraries.load(str(blend_file)) as (data_from, _):
+        names = {k: set(getattr(data_from, k)) for k in LISTED_COLLECTIONS}
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    with open(cache_path, "w") as f:
+        json.dump({k: sorted(v) for k, v in names.items()}, f)
+    return names
+
+
+def check_job(job: Job, names: DataBlockNames) -> list[str]:
+    asset = job.asset
+    errors: list[str] = []
+
+    def require(collection: str, name: str, what: str):
+        if name not in names[collection]:
+            errors.append(
+                f"{job.config_path}: {what} '{name}' not found in {asset.blend_file_path}"
+            )
+
+    if isinstance(asset, AnimSpriteConfig):
+        require("objects", "Camera", "camera object")
+        for clip in asset.clip_configs():
+            for obj_config in clip.object_configs:
+                require("objects", obj_config.object_name, "object")
+                if obj_config.action_name is not None:
+                    require("actions", obj_config.action_name, "action")
+    elif isinstance(asset, MaterialConfig):
+        require("materials", asset.material_name, "material")
+    elif isinstance(asset, AnimSceneConfig):
+        require("objects", asset.object_name, "object")
+        for action_config in asset.action_configs:
+            require("actions", action_config.action_name, "action")
+    # Clips sharing objects report them once
+    return list(dict.fromkeys(errors))
+
+
+def preflight(jobs: list[Job], cache_dir: Path) -> list[str]:
+    """Check every name referenced by the jobs exists in its blend file."""
+    listings: dict[Path, DataBlockNames] = {}
+    errors: list[str] = []
+    for job in jobs:
+        blend_file = job.asset.blend_file_path
+        if not blend_file.is_file():
+            continue
+        if blend_file not in listings:
+            listings[blend_file] = list_datablocks(blend_file, cache_dir)
+        errors.extend(check_job(job, listings[blend_file]))
+    return errors
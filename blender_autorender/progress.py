@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, TextIO
+
+
+class Progress:
+    """Tracks render progress for the whole run and the asset being rendered.
+
+    Completed renders are reported by the render code through `render_done`.
+    Updates are drawn on `display_fd` (which should
+    be the real terminal, not the captured stdout) and optionally appended to
+    a JSON-lines events file. The tracker owns `display_fd` and closes it in
+    `close`.
+    """
+
+    def __init__(
+        self,
+        total_renders: int,
+        display_fd: int | None = None,
+        events_path: Path | None = None,
+        run_start: float | None = None,
+        run_renders_done: int = 0,
+    ):
+        self.lock = threading.Lock()
+        self.total_renders = total_renders
+        self.display_fd = display_fd
+        self.interactive = display_fd is not None and os.isatty(display_fd)
+        self.events: TextIO | None = None
+        if events_path is not None:
+            events_path.parent.mkdir(parents=True, exist_ok=True)
+            self.events = open(events_path, "a")
+
+        # A run split over several processes carries these over
+        self.run_start = time.monotonic() if run_start is None else run_start
+        self.run_renders_done = run_renders_done
+
+        self.asset_id: str | None = None
+        self.asset_start = self.run_start
+        self.asset_renders = 0
+        self.asset_renders_per_frame = 1
+        self.asset_renders_done = 0
+
+    def start_asset(self, asset_id: str, renders: int, renders_per_frame: int):
+        with self.lock:
+            self.asset_id = asset_id
+            self.asset_start = time.monotonic()
+            self.asset_renders = renders
+            self.asset_renders_per_frame = max(renders_per_frame, 1)
+            self.asset_renders_done = 0
+            self._emit("asset_start")
+
+    def finish_asset(self):
+        with self.lock:
+            # Keep the run totals consistent even if the estimate was off
+            self.run_renders_done += self.asset_renders - self.asset_renders_done
+            self.asset_renders_done = self.asset_renders
+            self._emit("asset_done")
+            if self.interactive:
+                self._write("\n")
+            self.asset_id = None
+
+    def render_done(self):
+        with self.lock:
+            if self.asset_renders_done < self.asset_renders:
+                self.asset_renders_done += 1
+                self.run_renders_done += 1
+            self._emit("render_done")
+
+    def close(self, run_done: bool = True):
+        with self.lock:
+            if run_done:
+                self._emit("run_done")
+            if self.events is not None:
+                self.events.close()
+                self.events = None
+            if self.display_fd is not None:
+                os.close(self.display_fd)
+                self.display_fd = None
+                self.interactive = False
+
+    def _fraction(self, done: float, total: int) -> float:
+        return min(done / total, 1.0) if total > 0 else 1.0
+
+    def _snapshot(self) -> dict[str, Any]:
+        now = time.monotonic()
+        asset_elapsed = now - self.asset_start
+        asset_fraction = self._fraction(self.asset_renders_done, self.asset_renders)
+        run_elapsed = now - self.run_start
+        run_fraction = self._fraction(self.run_renders_done, self.total_renders)
+
+        def eta(elapsed: float, fraction: float) -> float | None:
+            if fraction <= 0:
+                return None
+            return elapsed / fraction * (1 - fraction)
+
+        frames_done = self.asset_renders_done / self.asset_renders_per_frame
+        return {
+            "asset": self.asset_id,
+            "renders_done": self.asset_renders_done,
+            "renders_total": self.asset_renders,
+            "frames_per_minute": (
+                frames_done / asset_elapsed * 60 if asset_elapsed > 0 else 0.0
+            ),
+            "asset_eta_s": eta(asset_elapsed, asset_fraction),
+            "run_renders_done": self.run_renders_done,
+            "run_renders_total": self.total_renders,
+            "run_eta_s": eta(run_elapsed, run_fraction),
+        }
+
+    def _emit(self, event: str):
+        snapshot = self._snapshot()
+        if self.events is not None:
+            self.events.write(
+                json.dumps({"t": time.time(), "event": event, **snapshot})
+            )
+            self.events.write("\n")
+            self.events.flush()
+        if self.display_fd is None or snapshot["asset"] is None:
+            return
+        if self.interactive:
+            self._write("\r\033[K" + self._format(snapshot))
+        elif event in ("render_done", "asset_done"):
+            self._write(self._format(snapshot) + "\n")
+
+    def _format(self, snapshot: dict[str, Any]) -> str:
+        def duration(seconds: float | None) -> str:
+            if seconds is None:
+                return "--:--"
+            minutes, seconds = divmod(int(seconds), 60)
+            return f"{minutes:02d}:{seconds:02d}"
+
+        return (
+            f"   {snapshot['asset']}: {snapshot['renders_done']}/{snapshot['renders_total']} renders"
+            f", {snapshot['frames_per_minute']:.1f} frames/min"
+            f", ETA {duration(snapshot['asset_eta_s'])}"
+            f" (run {snapshot['run_renders_done']}/{snapshot['run_renders_total']}"
+            f", ETA {duration(snapshot['run_eta_s'])})"
+        )
+
+    def _write(self, text: str):
+        assert self.display_fd is not None
+        os.write(self.display_fd, text.encode())
+
+
+class ProgressForwarder:
+    """Stands in for `Progress` in a worker process, sending its events to the
+    parent's tracker, which `relay` feeds them to.
+
+    The queue should be a `SimpleQueue`, which sends in the calling thread: a
+    feeder thread could wait on the GIL for as long as the next render runs.
+    """
+
+    def __init__(self, queue: Any):
+        self.queue = queue
+
+    def render_done(self):
+        self.queue.put("render_done")
+
+
+def forward_to(queue: Any):
+    """Worker process initializer sending progress events to `queue`."""
+    activate(ProgressForwarder(queue))
+
+
+def relay(queue: Any, tracker: "Progress | ProgressForwarder | None"):
+    """Feed events sent by worker processes to `tracker`, until None."""
+    while True:
+        event = queue.get()
+        if event is None:
+            return
+        if event == "render_done" and tracker is not None:
+            tracker.render_done()
+
+
+_current: Progress | ProgressForwarder | None = None
+
+
+def activate(progress: Progress | ProgressForwarder | None):
+    global _current
+    _current = progress
+
+
+def current() -> Progress | ProgressForwarder | None:
+    return _current
+
+
+def render_done():
+    """Report that a render (or bake) finished, if progress is being tracked."""
+    if _current is not None:
+        _current.render_done()
@@ -0,0 +1,209 @@
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from multiprocessing.connection import Connection
+from pathlib import Path
+from typing import Callable
+
+from blender_autorender.config import (
+    MaterialConfig,
+    AnimSpriteConfig,
+    AnimSceneConfig,
+)
+from blender_autorender.plan import Job, estimate
+from blender_autorender import progress, trace
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process, in MiB."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # No procfs, fall back on the peak RSS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def render_job(job: Job, log_path: Path):
+    # Imported here so that bpy is only loaded once we actually render
+    asset = job.asset
+    if isinstance(asset, MaterialConfig):
+        from blender_autorender.material import entrypoint_material
+
+        entrypoint_material(
+            config=asset,
+            toplevel_output_dir=job.output_dir,
+            log_path=log_path,
+            png=job.png,
+        )
+    elif isinstance(asset, AnimSpriteConfig):
+        from blender_autorender.anim_sprite import entrypoint
+
+        entrypoint(
+            config=asset,
+            toplevel_output_dir=job.output_dir,
+            log_path=log_path,
+            png=job.png,
+        )
+    elif isinstance(asset, AnimSceneConfig):
+        from blender_autorender.anim_scn import AnimSceneProcessor
+
+        processor = AnimSceneProcessor(
+            config=asset,
+            toplevel_output_dir=job.output_dir,
+            log_path=log_path,
+        )
+        processor.process()
+    else:
+        print(f"Unrecognized asset config variant: {type(asset)}")
+        exit(1)
+
+
+def _process_jobs(
+    jobs: list[Job],
+    start_index: int,
+    tracker: progress.Progress,
+    after_job: Callable[[int], bool],
+) -> bool:
+    """Render jobs[start_index:] in this process.
+
+    `after_job` is called with the index of each finished job, and stops the
+    loop early by returning False. Returns whether all jobs were rendered.
+    """
+    for i in range(start_index, len(jobs)):
+        job = jobs[i]
+        if i == 0 or jobs[i - 1].collection_id != job.collection_id:
+            print(
+                f"Processing collection {job.collection_id}, results will be saved in {job.output_dir}"
+            )
+
+        frames, renders = estimate(job)
+        log_path = job.output_dir.joinpath("logs", f"{job.asset.id}.log")
+        print(f" - Rendering {job.asset.variant} from {job.config_path}")
+        print(f"   Blender output is logged to {log_path}")
+        sys.stdout.flush()
+        tracker.start_asset(job.asset.id, renders, renders // (frames or 1))
+        render_job(job, log_path)
+        tracker.finish_asset()
+
+        if i == len(jobs) - 1 or jobs[i + 1].collection_id != job.collection_id:
+            print(f"Finished collection {job.collection_id}!")
+
+        if not after_job(i):
+            return i == len(jobs) - 1
+    return True
+
+
+def _worker_main(
+    conn: Connection,
+    jobs: list[Job],
+    start_index: int,
+    memory_budget_mb: float,
+    trace_enabled: bool,
+    events_path: Path | None,
+    run_start: float,
+    run_renders_done: int,
+):
+    if trace_enabled:
+        trace.enable()
+    tracker = progress.Progress(
+        total_renders=sum(estimate(job)[1] for job in jobs),
+        display_fd=os.dup(sys.stdout.fileno()),
+        events_path=events_path,
+        run_start=run_start,
+        run_renders_done=run_renders_done,
+    )
+    progress.activate(tracker)
+
+    def after_job(index: int) -> bool:
+        conn.send(("done", index, trace.drain()))
+        rss = current_rss_mb()
+        if rss > memory_budget_mb:
+            conn.send(("recycle", index, rss))
+            return False
+        return True
+
+    finished = False
+    try:
+        finished = _process_jobs(jobs, start_index, tracker, after_job)
+    finally:
+        tracker.close(run_done=finished)
+        conn.close()
+
+
+def _run_jobs_in_workers(
+    jobs: list[Job], memory_budget_mb: float, events_path: Path | None
+):
+    """Render jobs in a worker process that is replaced whenever its RSS goes
+    over the memory budget after a job."""
+    context = multiprocessing.get_context("spawn")
+    run_start = time.monotonic()
+    next_index = 0
+    run_renders_done = 0
+    while next_index < len(jobs):
+        parent_conn, child_conn = context.Pipe(duplex=False)
+        worker = context.Process(
+            target=_worker_main,
+            args=(
+                child_conn,
+                jobs,
+                next_index,
+                memory_budget_mb,
+                trace.enabled(),
+                events_path,
+                run_start,
+                run_renders_done,
+            ),
+        )
+        sys.stdout.flush()
+        worker.start()
+        child_conn.close()
+
+        while True:
+            try:
+                message = parent_conn.recv()
+            except EOFError:
+                break
+            kind, index, payload = message
+            if kind == "done":
+                next_index = index + 1
+                run_renders_done += estimate(jobs[index])[1]
+                trace.extend(payload)
+            elif kind == "recycle":
+                print(
+                    f"Worker RSS {payload:.0f} MiB is over the {memory_budget_mb} MiB budget, starting a new worker"
+                )
+
+        worker.join()
+        if worker.exitcode != 0:
+            raise RuntimeError(
+                f"Worker exited with code {worker.exitcode} while rendering {jobs[next_index].config_path}"
+            )
+
+
+def run_jobs(
+    jobs: list[Job],
+    memory_budget_mb: float | None = None,
+    events_path: Path | None = None,
+):
+    """Render all jobs, in this process or, when a memory budget is set, in
+    worker processes recycled once they exceed it."""
+    if memory_budget_mb is not None:
+        _run_jobs_in_workers(jobs, memory_budget_mb, events_path)
+        return
+
+    tracker = progress.Progress(
+        total_renders=sum(estimate(job)[1] for job in jobs),
+        display_fd=os.dup(sys.stdout.fileno()),
+        events_path=events_path,
+    )
+    progress.activate(tracker)
+    finished = False
+    try:
+        finished = _process_jobs(jobs, 0, tracker, lambda _: True)
+    finally:
+        tracker.close(run_done=finished)
+        progress.activate(None)
@@ -0,0 +1,143 @@
+"""Image work run on the writer processes: packing frames, assembling
+sheets and downsampling textures.
+
+Kept free of bpy, since the writer processes import this module to run it.
+"""
+
+from pathlib import Path
+from typing import Any
+
+from PIL import Image
+
+from blender_autorender.config import AnimSpriteConfig, MaterialConfig
+from blender_autorender import trace
+from blender_autorender.downsample import (
+    downsample_image,
+    size_dir_name,
+    write_downsampled,
+)
+from blender_autorender.passes import PASSES
+from blender_autorender.utils import pack_channels
+
+
+def assemble_spritesheet(
+    sprite_paths: list[Path | None], output_file_name: str, config: AnimSpriteConfig
+) -> Image.Image:
+    """Paste sprites into a sheet, row by row. None leaves a cell empty.
+
+    16-bit grayscale sprites, like depth maps, keep their precision.
+    """
+    num_sprites = len(sprite_paths)
+    num_rows = num_sprites // config.sheet_width + (
+        1 if num_sprites % config.sheet_width != 0 else 0
+    )
+    spritesheet_width = config.sheet_width * config.sprite_size
+    spritesheet_height = num_rows * config.sprite_size
+    mode = "RGBA"
+    first = next((p for p in sprite_paths if p is not None), None)
+    if first is not None:
+        with Image.open(first) as image:
+            if image.mode == "I;16":
+                mode = image.mode
+    spritesheet = Image.new(mode, (spritesheet_width, spritesheet_height))
+    for index, diffuse_file in enumerate(sprite_paths):
+        if diffuse_file is None:
+            continue
+        with trace.span("png_decode", asset=config.id, sheet=output_file_name):
+            diffuse_image = Image.open(diffuse_file)
+            diffuse_image.load()
+        x = (index % config.sheet_width) * config.sprite_size
+        y = (index // config.sheet_width) * config.sprite_size
+        spritesheet.paste(diffuse_image, (x, y))
+    return spritesheet
+
+
+def build_spritesheet(
+    sprite_paths: list[Path | None],
+    output_file_name: str,
+    config: AnimSpriteConfig,
+    output_dir: Path,
+    save_options: dict[str, Any] | None = None,
+):
+    sheets = sized_spritesheets(sprite_paths, output_file_name, config)
+    for file_name, spritesheet in sheets.items():
+        spritesheet_output_path = output_dir.joinpath(file_name)
+        spritesheet_output_path.parent.mkdir(parents=True, exist_ok=True)
+        with trace.span("png_encode", asset=config.id, sheet=file_name):
+            spritesheet.save(spritesheet_output_path, **(save_options or {}))
+        print(f"Spritesheet saved at {spritesheet_output_path}")
+
+
+def sized_spritesheets(
+    sprite_paths: list[Path | None], output_file_name: str, config: AnimSpriteConfig
+) -> dict[str, Image.Image]:
+    """Assemble a sheet and derive it at each output size.
+
+    Returns the sheets keyed by file name. With output sizes, each size goes
+    under `<size>px/`, downsampled from the sheet at `sprite_size`.
+    """
+    spritesheet = assemble_spritesheet(sprite_paths, output_file_name, config)
+    if not config.output_sizes:
+        return {output_file_name: spritesheet}
+
+    sheets = {}
+    for size in config.output_sizes:
+        file_name = str(Path(size_dir_name(size), output_file_name))
+        if size == config.sprite_size:
+            sheets[file_name] = spritesheet
+            continue
+        with trace.span("downsample", asset=config.id, sheet=file_name):
+            sheets[file_name] = downsample_image(
+                spritesheet,
+                size / config.sprite_size,
+                kind=Path(output_file_name).stem,
+            )
+    return sheets
+
+
+def traced_pack_channels(
+    config: AnimSpriteConfig,
+    frame: int,
+    name: str,
+    channels: list[Path | None],
+    output_file_name: str,
+    output_dir: Path,
+    save_options: dict[str, Any],
+) -> Path:
+    """Pack the frames of other passes into the R, G and B channels of
+    `name`'s frame."""
+    red, green, blue = channels
+    with trace.span("pack_channels", asset=config.id, render_pass=name, frame=frame):
+        return pack_channels(
+            red,
+            green,
+            blue,
+            output_file_name=output_file_name,
+            img_size=config.sprite_size,
+            output_dir=output_dir,
+            save_options=save_options,
+        )
+
+
+def traced_write_downsampled(
+    config: MaterialConfig,
+    path: Path,
+    output_dir: Path,
+    save_options: dict[str, Any],
+):
+    """Replace the texture at `path` with its copies at each output size,
+    like the sheets of `sized_spritesheets`."""
+    # Bakes go into sRGB byte images, so all but the non-colour normal bake,
+    # ORM included since it packs the roughness and metallic bakes, hold
+    # sRGB-encoded values
+    srgb = not PASSES[path.stem].data_pass
+    with trace.span("downsample", asset=config.id, render_pass=path.stem):
+        write_downsampled(
+            path,
+            output_dir,
+            config.sprite_size,
+            config.output_sizes,
+            save_options,
+            srgb=srgb,
+        )
+    path.unlink()
@@ -0,0 +1,122 @@
+# pyright: basic
+import hashlib
+import os
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from PIL import Image
+
+from blender_autorender.downsample import area_filter
+
+BlenderImage = Any
+
+PIL_MODES = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA"}
+
+# Part of the cache key, bumped whenever resampling changes so that copies
+# cached by an older version aren't reused
+RESAMPLE_VERSION = 2
+
+
+def fit_size(width: int, height: int, max_size: int) -> tuple[int, int]:
+    scale = max_size / max(width, height)
+    if scale >= 1:
+        return width, height
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def source_hash(image: BlenderImage, abspath: str, max_size: int) -> str:
+    """Hash of the image source data and target size, used as cache key.
+
+    Falls back to hashing the pixel buffer for images without a file or
+    packed data (e.g. generated images).
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{RESAMPLE_VERSION}:{max_size}:{image.channels}:".encode())
+    if image.packed_file is not None:
+        digest.update(image.packed_file.data)
+    elif abspath and os.path.isfile(abspath):
+        with open(abspath, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    else:
+        digest.update(read_pixels(image).tobytes())
+    return digest.hexdigest()
+
+
+def read_pixels(image: BlenderImage) -> np.ndarray:
+    """Image pixels as a float32 (height, width, channels) array, bottom row first."""
+    width, height = image.size
+    pixels = np.empty(width * height * image.channels, dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    return pixels.reshape(height, width, image.channels)
+
+
+def resample(pixels: np.ndarray, size: tuple[int, int]) -> np.ndarray:
+    """Shrink a float pixel array in [0, 1] to `size`, returning uint8 data.
+
+    Uses the area filter of `downsample`. With an alpha channel, colours are
+    averaged premultiplied by alpha, so that transparent texels don't bleed
+    into cut-out edges.
+    """
+    width, height = size
+    data = np.clip(pixels, 0.0, 1.0).astype(np.float32)
+    if data.shape[2] in (2, 4):
+        alpha = data[..., -1:]
+        filtered = area_filter(
+            np.concatenate([data[..., :-1] * alpha, alpha], axis=2), width, height
+        )
+        alpha = filtered[..., -1:]
+        color = np.where(alpha > 0, filtered[..., :-1] / np.maximum(alpha, 1e-8), 0.0)
+        filtered = np.concatenate([color, alpha], axis=2)
+    else:
+        filtered = area_filter(data, width, height)
+    return np.clip(filtered * 255.0 + 0.5, 0, 255).astype(np.uint8)
+
+
+def read_cached(path: Path, size: tuple[int, int], channels: int) -> np.ndarray | None:
+    """A cached resampled copy, or None if it is missing or unreadable, e.g.
+    left incomplete by a killed run."""
+    try:
+        with Image.open(path) as img:
+            return np.asarray(img, dtype=np.uint8).reshape(size[1], size[0], channels)
+    except (OSError, ValueError):
+        return None
+
+
+def downscale_image(image: BlenderImage, abspath: str, max_size: int, cache_dir: Path):
+    """Downscale a Blender image in place so that it fits in `max_size`.
+
+    The resampled result is cached by source hash, so repeated exports of an
+    unchanged texture skip decoding and resampling it.
+    """
+    width, height = image.size
+    new_size = fit_size(width, height, max_size)
+    if new_size == (width, height):
+        return
+    if image.is_float:
+        print(f"Image {image.name}: skipping downscale of float image")
+        return
+    if image.channels not in PIL_MODES:
+        print(f"Image {image.name}: unsupported channel count {image.channels}")
+        return
+
+    cache_path = cache_dir.joinpath(f"{source_hash(image, abspath, max_size)}.png")
+    resized = read_cached(cache_path, new_size, image.channels)
+    if resized is not None:
+        print(f"Image {image.name}: using cached {new_size[0]}x{new_size[1]} copy")
+    else:
+        resized = resample(read_pixels(image), new_size)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # Written under a temporary name, so a killed run can't leave a
+        # partial file behind
+        partial_path = cache_path.with_suffix(f".{os.getpid()}.partial")
+        Image.fromarray(
+            resized.squeeze(axis=2) if image.channels == 1 else resized
+        ).save(partial_path, format="PNG")
+        os.replace(partial_path, cache_path)
+        print(f"Image {image.name}: downscaled from {width}x{height} to {new_size}")
+
+    image.scale(*new_size)
+    image.pixels.foreach_set((resized.astype(np.float32) / 255.0).ravel())
+    image.update()
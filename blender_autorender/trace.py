@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+# Recorded spans, or None while tracing is disabled
+_events: list[dict[str, Any]] | None = None
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name: str, args: dict[str, Any]):
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *_):
+        end = time.perf_counter_ns()
+        if _events is not None:
+            _events.append(
+                {
+                    "name": self.name,
+                    "cat": "autorender",
+                    "ph": "X",
+                    "ts": self.start / 1000,
+                    "dur": (end - self.start) / 1000,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "args": self.args,
+                }
+            )
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def enable():
+    global _events
+    if _events is None:
+        _events = []
+
+
+def enabled() -> bool:
+    return _events is not None
+
+
+def span(name: str, **args: Any) -> _Span | _NoopSpan:
+    """Time a block of code. Keyword arguments are stored as span tags.
+
+    Does nothing (and allocates nothing) while tracing is disabled.
+    """
+    if _events is None:
+        return _NOOP_SPAN
+    return _Span(name, args)
+
+
+def events() -> list[dict[str, Any]]:
+    return list(_events or [])
+
+
+def drain() -> list[dict[str, Any]]:
+    """Return the recorded spans and forget them."""
+    recorded = events()
+    if _events is not None:
+        _events.clear()
+    return recorded
+
+
+def extend(recorded: list[dict[str, Any]]):
+    """Add spans recorded elsewhere, e.g. in a worker process."""
+    if _events is not None:
+        _events.extend(recorded)
+
+
+def write_chrome_trace(path: Path):
+    """Write the recorded spans as Chrome trace-event JSON (also read by Perfetto)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events(), "displayTimeUnit": "ms"}, f)
+
+
+def summary() -> str:
+    """Aggregate table of the recorded spans, slowest stage first."""
+    totals: dict[str, list[float]] = {}
+    for event in events():
+        totals.setdefault(event["name"], []).append(event["dur"] / 1000)
+
+    header = (
+        f"{'stage':<20} {'count':>6} {'total ms':>11} {'mean ms':>10} {'max ms':>10}"
+    )
+    lines = [header, "-" * len(header)]
+    for name, durations in sorted(totals.items(), key=lambda kv: -sum(kv[1])):
+        lines.append(
+            f"{name:<20} {len(durations):>6} {sum(durations):>11.1f} "
+            f"{sum(durations) / len(durations):>10.1f} {max(durations):>10.1f}"
+        )
+    return "\n".join(lines)
@@ -1,6 +1,7 @@
 # pyright: basic
 import sys
 import os
+import ctypes
 
 from pathlib import Path
 from typing import Any, Callable
@@ -8,6 +9,8 @@ from uuid import uuid4
 from PIL import Image
 import numpy as np
 
+from blender_autorender import trace
+
 
 def pack_channels(
     red: Path | None,
@@ -16,6 +19,7 @@ def pack_channels(
     output_file_name: str,
     img_size: int,
     output_dir: Path,
+    save_options: dict[str, Any] | None = None,
 ) -> Path:
     def load_or_default(
         img_path: Path | None,
@@ -24,7 +28,8 @@ def pack_channels(
         size: tuple[int, int] | None = None,
     ) -> Image.Image:
         if img_path:
-            img = Image.open(img_path).convert("LA")
+            with trace.span("png_decode"):
+                img = Image.open(img_path).convert("LA")
             if size:
                 img = img.resize(size)
         else:
@@ -69,10 +74,10 @@ def pack_channels(
             alpha_img,
         ),
     )
-    if not output_dir.exists():
-        output_dir.mkdir()
+    output_dir.mkdir(parents=True, exist_ok=True)
     path = output_dir.joinpath(output_file_name)
-    merged.save(path)
+    with trace.span("png_encode"):
+        merged.save(path, **(save_options or {}))
     return path
 
 
@@ -133,15 +138,31 @@ def reconnect_bsdf_input(
     return new_mat
 
 
-def run_with_redirected_logs(log_file: Path, callable: Callable[[], Any]) -> Any:
-    open(log_file, "a").close()
-    old = os.dup(sys.stdout.fileno())
-    sys.stdout.flush()
-    os.close(sys.stdout.fileno())
-    fd = os.open(log_file, os.O_WRONLY)
+def _flush_c_stdout():
+    # Blender writes through C stdio, which is block buffered on a file
+    try:
+        ctypes.CDLL(None).fflush(None)
+    except (OSError, AttributeError):
+        pass
 
-    out = callable()
 
+def run_with_redirected_logs(log_file: Path, callable: Callable[[], Any]) -> Any:
+    """Run `callable` with stdout written straight to `log_file`.
+
+    Blender's own output never waits on this process, so a chatty operator
+    can't block while it holds the GIL. stdout is restored afterwards, even
+    if the callable raises.
+    """
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    sys.stdout.flush()
+    saved_stdout = os.dup(sys.stdout.fileno())
+    fd = os.open(log_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    os.dup2(fd, sys.stdout.fileno())
     os.close(fd)
-    os.dup(old)
-    os.close(old)
+    try:
+        return callable()
+    finally:
+        sys.stdout.flush()
+        _flush_c_stdout()
+        os.dup2(saved_stdout, sys.stdout.fileno())
+        os.close(saved_stdout)
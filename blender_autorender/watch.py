@@ -0,0 +1,304 @@
+"""Watch mode: re-render the assets whose inputs change.
+
+Rendering happens in this process, so `bpy` is only imported once and stays
+loaded between rebuilds. The top-level config, asset configs and blend files
+are watched with inotify where available, and by polling otherwise.
+"""
+
+import ctypes
+import os
+import select
+import struct
+import time
+from pathlib import Path
+from typing import Protocol
+
+from blender_autorender.config import TopLevelConfig
+from blender_autorender.plan import (
+    Job,
+    load_jobs,
+    load_toplevel_config,
+    resolve_path,
+)
+from blender_autorender.preflight import file_hash, preflight
+from blender_autorender.runner import run_jobs
+from blender_autorender import trace
+
+# Changes closer together than this are handled as a single rebuild, so that
+# e.g. Blender writing a temporary file and renaming it only triggers once
+DEBOUNCE_S = 0.5
+# How often watched files are checked when inotify is unavailable
+POLL_INTERVAL_S = 1.0
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class Watcher(Protocol):
+    def watch(self, paths: set[Path]):
+        """Watch `paths` instead of the previous set.
+
+        Changes to files that stay watched are kept until the next `wait`,
+        even if they happened before this call.
+        """
+        ...
+
+    def wait(self, timeout: float | None) -> set[Path]:
+        """Block until some watched files change, or the timeout expires.
+
+        Returns the changed files, which is empty on timeout.
+        """
+        ...
+
+    def close(self): ...
+
+
+class InotifyWatcher:
+    """Watches the directories containing the files, since editors often save
+    by writing a new file and renaming it over the old one."""
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.dirs: dict[int, Path] = {}
+        self.paths: set[Path] = set()
+
+    def watch(self, paths: set[Path]):
+        self.paths = {p.resolve() for p in paths}
+        wanted = {p.parent for p in self.paths}
+        for wd, directory in list(self.dirs.items()):
+            if directory not in wanted:
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.dirs[wd]
+        for directory in wanted - set(self.dirs.values()):
+            wd = self.libc.inotify_add_watch(
+                self.fd, os.fsencode(directory), WATCH_MASK
+            )
+            if wd >= 0:
+                self.dirs[wd] = directory
+
+    def wait(self, timeout: float | None) -> set[Path]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return set()
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if not readable:
+                return set()
+            changed = self._read_events()
+            if changed:
+                return changed
+
+    def _read_events(self) -> set[Path]:
+        data = os.read(self.fd, 64 * 1024)
+        changed: set[Path] = set()
+        offset = 0
+        while offset < len(data):
+            wd, _, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + name_len].rstrip(b"\0")
+            offset += name_len
+            directory = self.dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory.joinpath(os.fsdecode(name))
+            if path in self.paths:
+                changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    def __init__(self, interval: float = POLL_INTERVAL_S):
+        self.interval = interval
+        self.signatures: dict[Path, tuple[int, int] | None] = {}
+
+    def _signature(self, path: Path) -> tuple[int, int] | None:
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def watch(self, paths: set[Path]):
+        resolved = {p.resolve() for p in paths}
+        self.signatures = {
+            p: self.signatures[p] if p in self.signatures else self._signature(p)
+            for p in resolved
+        }
+
+    def wait(self, timeout: float | None) -> set[Path]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed: set[Path] = set()
+            for path, signature in self.signatures.items():
+                current = self._signature(path)
+                if current != signature:
+                    self.signatures[path] = current
+                    changed.add(path)
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            time.sleep(
+                self.interval
+                if deadline is None
+                else max(0.0, min(self.interval, deadline - time.monotonic()))
+            )
+
+    def close(self):
+        pass
+
+
+def make_watcher() -> Watcher:
+    try:
+        return InotifyWatcher()
+    except (OSError, AttributeError):
+        # Not on Linux, or out of inotify instances
+        print("inotify is unavailable, polling for changes instead")
+        return PollingWatcher()
+
+
+def wait_for_changes(watcher: Watcher, debounce_s: float = DEBOUNCE_S) -> set[Path]:
+    """Wait for a change, then keep collecting changes until none happen for
+    `debounce_s` seconds."""
+    changed = watcher.wait(None)
+    while True:
+        more = watcher.wait(debounce_s)
+        if not more:
+            return changed
+        changed |= more
+
+
+def watched_paths(
+    config_path: Path,
+    config: TopLevelConfig,
+    jobs: list[Job],
+    asset_collection: str | None,
+) -> set[Path]:
+    """Every input file of the run, including asset configs that failed to
+    load, so that fixing them triggers a rebuild."""
+    paths = {config_path}
+    for collection in config.collections:
+        if asset_collection is None or asset_collection == collection.id:
+            paths.update(resolve_path(config_path, p) for p in collection.asset_configs)
+    paths.update(job.asset.blend_file_path for job in jobs)
+    return {p.resolve() for p in paths}
+
+
+def job_key(job: Job) -> tuple[str, Path]:
+    return job.collection_id, job.config_path.resolve()
+
+
+def job_fingerprint(job: Job, blend_hashes: dict[Path, str]) -> str:
+    """Everything a job's output depends on: its settings and blend file."""
+    blend_file = job.asset.blend_file_path.resolve()
+    if blend_file not in blend_hashes and blend_file.is_file():
+        blend_hashes[blend_file] = file_hash(blend_file)
+    return "\n".join(
+        [
+            job.asset.model_dump_json(),
+            str(job.output_dir.resolve()),
+            job.png.model_dump_json(),
+            blend_hashes.get(blend_file, ""),
+        ]
+    )
+
+
+def rebuild(
+    jobs: list[Job],
+    preflight_cache_dir: Path,
+    events_path: Path | None,
+    trace_path: Path | None,
+) -> list[Job]:
+    """Render the jobs that pass preflight, returning those that succeeded.
+
+    Failures are reported but do not stop watching.
+    """
+    rendered: list[Job] = []
+    for job in jobs:
+        errors = preflight([job], preflight_cache_dir)
+        for error in errors:
+            print(f"❌ {error}")
+        if errors:
+            continue
+        try:
+            run_jobs([job], events_path=events_path)
+        except Exception as e:
+            print(f"❌ {job.config_path}: {type(e).__name__}: {e}")
+            continue
+        rendered.append(job)
+
+    if trace_path is not None:
+        trace.write_chrome_trace(trace_path)
+    return rendered
+
+
+def watch(
+    config_path: Path,
+    asset_collection: str | None,
+    events_path: Path | None = None,
+    trace_path: Path | None = None,
+):
+    """Render everything once, then re-render affected assets on every change
+    until interrupted."""
+    config = load_toplevel_config(config_path)
+    blend_hashes: dict[Path, str] = {}
+    # Fingerprint of each job's inputs as of its last successful render
+    rendered: dict[tuple[str, Path], str] = {}
+    watcher = make_watcher()
+    changed: set[Path] = set()
+
+    try:
+        while True:
+            jobs, errors = load_jobs(config_path, config, asset_collection)
+            for error in errors:
+                print(f"❌ {error}")
+
+            for path in changed:
+                blend_hashes.pop(path, None)
+            fingerprints = {job_key(j): job_fingerprint(j, blend_hashes) for j in jobs}
+            affected = [
+                j for j in jobs if rendered.get(job_key(j)) != fingerprints[job_key(j)]
+            ]
+            # Armed before rendering, so that saves made during the render
+            # trigger the next rebuild
+            watcher.watch(watched_paths(config_path, config, jobs, asset_collection))
+
+            if affected:
+                print(f"🔁 Rendering {len(affected)} of {len(jobs)} assets")
+                cache_dir = resolve_path(config_path, config.output_dir).joinpath(
+                    ".cache", "preflight"
+                )
+                for job in rebuild(affected, cache_dir, events_path, trace_path):
+                    rendered[job_key(job)] = fingerprints[job_key(job)]
+            elif changed:
+                print("No assets affected")
+
+            print(f"👀 Watching {config_path} for changes (Ctrl+C to stop)")
+            changed = wait_for_changes(watcher)
+            print(f"Changed: {', '.join(sorted(p.name for p in changed))}")
+
+            if config_path.resolve() in changed:
+                try:
+                    config = load_toplevel_config(config_path)
+                except Exception as e:
+                    # Likely mid-edit, keep the previous config until it parses
+                    print(f"❌ {config_path}: {e}")
+    except KeyboardInterrupt:
+        print("Stopped watching")
+    finally:
+        watcher.close()
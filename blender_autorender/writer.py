@@ -0,0 +1,249 @@
+# pyright: basic
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import traceback
+from concurrent.futures import Future, wait
+from multiprocessing import connection
+from multiprocessing.connection import Connection
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+
+import numpy as np
+from PIL import Image
+
+from blender_autorender.config import PngConfig
+from blender_autorender import trace
+
+T = TypeVar("T")
+
+# How often blocked callers check that the writer processes are still alive
+WORKER_CHECK_INTERVAL_S = 1.0
+
+# zlib strategy constants, passed to Pillow as `compress_type`
+ZLIB_STRATEGIES = {
+    "default": 0,
+    "filtered": 1,
+    "huffman": 2,
+    "rle": 3,
+    "fixed": 4,
+}
+
+
+def png_save_options(config: PngConfig) -> dict[str, Any]:
+    """Keyword arguments for `Image.save` matching the PNG config."""
+    return {
+        "compress_level": config.compress_level,
+        "compress_type": ZLIB_STRATEGIES[config.strategy],
+    }
+
+
+def blender_compression(config: PngConfig) -> int:
+    """The PNG config as Blender's 0-100% output compression setting."""
+    return round(config.compress_level / 9 * 100)
+
+
+def pil_from_pixels(pixels: np.ndarray) -> Image.Image:
+    """Convert float RGBA pixels in Blender's bottom-up order to a PIL image."""
+    data = np.clip(pixels * 255.0 + 0.5, 0, 255).astype(np.uint8)
+    return Image.fromarray(np.ascontiguousarray(np.flipud(data)), mode="RGBA")
+
+
+def save_image(image: Image.Image, path: Path, save_options: dict[str, Any]) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with trace.span("png_encode", file=path.name):
+        image.save(path, **save_options)
+    return path
+
+
+def _writer_main(tasks: Any, results: Connection, results_lock: Any, task_dir: Path):
+    """Run the writer's tasks until it sends None.
+
+    Tasks and results are passed as pickle files in `task_dir`, so that only
+    short messages go through the queues.
+    """
+    while True:
+        message = tasks.get()
+        if message is None:
+            return
+        task_id, task_path = message
+        try:
+            with open(task_path, "rb") as f:
+                fn, trace_enabled, args, kwargs = pickle.load(f)
+            os.unlink(task_path)
+            if trace_enabled:
+                trace.enable()
+            result = fn(*args, **kwargs)
+            result_path = task_dir.joinpath(f"{task_id}.result")
+            with open(result_path, "wb") as f:
+                pickle.dump((result, trace.drain()), f, pickle.HIGHEST_PROTOCOL)
+            message = (task_id, result_path, None)
+        except Exception as e:
+            e.add_note(traceback.format_exc())
+            try:
+                pickle.dumps(e)
+            except Exception:
+                e = RuntimeError(traceback.format_exc())
+            message = (task_id, None, e)
+        with results_lock:
+            results.send(message)
+
+
+class ImageWriter:
+    """Worker processes that encode and write images while rendering carries
+    on.
+
+    Blender operators hold the GIL for as long as they run, so neither
+    threads in the rendering process nor a `ProcessPoolExecutor`, whose
+    feeder threads need the GIL too, get any work done during a render.
+    `submit` therefore hands each task over before returning: it is pickled
+    to a file in the calling thread, and the workers are sent its path. The
+    frames of anim_sprite renders are still encoded by the compositor inside
+    the render operator.
+
+    Tasks must be module-level functions in modules that don't import bpy
+    (see `sheets`), or every worker would load Blender. At most `max_pending`
+    tasks are queued or running at a time; submitting more blocks the caller
+    until one finishes, so memory held by pending images stays bounded.
+    """
+
+    def __init__(self, config: PngConfig):
+        self.config = config
+        self.save_options = png_save_options(config)
+        self.slots = threading.BoundedSemaphore(config.max_pending)
+        self.futures: list[Future[Any]] = []
+        self.lock = threading.Lock()
+        self.pending: dict[int, Future[Any]] = {}
+        self.next_id = 0
+
+        context = multiprocessing.get_context("spawn")
+        self.task_dir = Path(tempfile.mkdtemp(prefix="autorender-writer-"))
+        self.tasks = context.SimpleQueue()
+        self.results, results_writer = context.Pipe(duplex=False)
+        # Kept alive until the workers have unpickled it
+        self.results_lock = context.Lock()
+        self.stopping = False
+        self.workers = [
+            context.Process(
+                target=_writer_main,
+                args=(self.tasks, results_writer, self.results_lock, self.task_dir),
+                name=f"png-writer-{i}",
+                daemon=True,
+            )
+            for i in range(config.writer_processes)
+        ]
+        for worker in self.workers:
+            worker.start()
+        results_writer.close()
+        self.reader = threading.Thread(
+            target=self._read_results, name="png-writer-results", daemon=True
+        )
+        self.reader.start()
+
+    def submit(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> "Future[T]":
+        while not self.slots.acquire(timeout=WORKER_CHECK_INTERVAL_S):
+            self._check_workers()
+        with self.lock:
+            task_id = self.next_id
+            self.next_id += 1
+        future: Future[T] = Future()
+        task_path = self.task_dir.joinpath(f"{task_id}.task")
+        try:
+            with open(task_path, "wb") as f:
+                pickle.dump(
+                    (fn, trace.enabled(), args, kwargs), f, pickle.HIGHEST_PROTOCOL
+                )
+            with self.lock:
+                self.pending[task_id] = future
+            self.tasks.put((task_id, task_path))
+        except BaseException:
+            with self.lock:
+                self.pending.pop(task_id, None)
+            self.slots.release()
+            raise
+        self.futures.append(future)
+        return future
+
+    def save(self, image: Image.Image, path: Path, **options: Any) -> "Future[Path]":
+        """Write `image` to `path`, with `options` added to the save options."""
+        return self.submit(save_image, image, path, {**self.save_options, **options})
+
+    def _read_results(self):
+        """Resolve futures as results come in, failing the pending ones if a
+        writer process dies."""
+        sentinels = [worker.sentinel for worker in self.workers]
+        while True:
+            # Once stopping, workers exit after sending their last result, and
+            # the pipe reports EOF when all of them are gone
+            ready = connection.wait(
+                [self.results] if self.stopping else [self.results, *sentinels]
+            )
+            if self.results in ready:
+                try:
+                    self._resolve(self.results.recv())
+                    continue
+                except EOFError:
+                    if self.stopping:
+                        return
+            dead = next((w for w in self.workers if w.exitcode is not None), None)
+            if dead is None:
+                continue
+            error = RuntimeError(
+                f"Image writer {dead.name} exited with code {dead.exitcode}"
+            )
+            with self.lock:
+                failed = list(self.pending.values())
+                self.pending.clear()
+            for future in failed:
+                future.set_exception(error)
+            return
+
+    def _resolve(self, message: tuple[int, Path | None, Exception | None]):
+        task_id, result_path, error = message
+        with self.lock:
+            future = self.pending.pop(task_id)
+        self.slots.release()
+        if error is not None:
+            future.set_exception(error)
+            return
+        assert result_path is not None
+        with open(result_path, "rb") as f:
+            result, events = pickle.load(f)
+        os.unlink(result_path)
+        trace.extend(events)
+        future.set_result(result)
+
+    def _check_workers(self):
+        if not self.reader.is_alive():
+            raise RuntimeError("An image writer process exited")
+
+    def wait(self):
+        """Block until every submitted task is done, re-raising any failure."""
+        futures, self.futures = self.futures, []
+        for future in futures:
+            while not wait([future], timeout=WORKER_CHECK_INTERVAL_S).done:
+                self._check_workers()
+            future.result()
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            self.stopping = True
+            for _ in self.workers:
+                self.tasks.put(None)
+            for worker in self.workers:
+                worker.join()
+            self.reader.join()
+            self.results.close()
+            shutil.rmtree(self.task_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+        return False